@@ -0,0 +1,238 @@
+import os
+import shutil
+
+# Speech recognition backends. Every engine has whisper's transcribe(audio, **options)
+# returning a dict with "text", so it can be used wherever a whisper model is.
+ENGINES = ["pytorch", "ctranslate2", "onnx"]
+DEFAULT_ENGINE = "pytorch"
+
+RATE = 16000
+# ONNX Runtime's whisper models decode 30 second windows
+WINDOW_SAMPLES = 30 * RATE
+
+# openai-whisper names of the models that are published under another name elsewhere
+CTRANSLATE2_NAMES = {"large": "large-v3"}
+HF_NAMES = {"large": "large-v3", "turbo": "large-v3-turbo"}
+
+# whisper transcribe options per decode profile. "balanced" is whisper's own defaults;
+# "fastest" decodes greedily once without timestamps or fallback, "accurate" adds beam search
+DECODE_PROFILES = {
+    "fastest": {"temperature": 0.0, "beam_size": None, "best_of": None, "condition_on_previous_text": False,
+                "without_timestamps": True, "compression_ratio_threshold": None, "logprob_threshold": None},
+    "balanced": {"temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0), "beam_size": None, "best_of": None,
+                 "condition_on_previous_text": True, "without_timestamps": False},
+    "accurate": {"temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0), "beam_size": 5, "best_of": 5,
+                 "condition_on_previous_text": True, "without_timestamps": False},
+}
+DEFAULT_PROFILE = "balanced"
+
+# Spoken languages offered in the GUI, any whisper language code works in the config.
+# With "auto" whisper detects the language once and the result is reused for the session
+SPOKEN_LANGUAGES = ["auto", "en", "es", "fr", "de", "it", "pt", "nl", "pl", "ru", "uk", "tr",
+                    "zh", "ja", "ko", "hi"]
+detected_language = None
+# whisper's own threshold for treating a segment as silence
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def load_engine(engine, model_name, threads=0, quantized=False):
+    """
+    Load model_name with the given engine; threads=0 leaves the thread count to the backend.
+    quantized applies to the PyTorch engine, see load_quantized
+    """
+    if engine == "pytorch":
+        if quantized:
+            return load_quantized(model_name)
+        import whisper
+        return whisper.load_model(model_name)
+    if engine == "ctranslate2":
+        return CTranslate2Engine(model_name, threads)
+    if engine == "onnx":
+        return OnnxEngine(model_name, threads)
+    raise ValueError(f"Unknown ASR engine: {engine}")
+
+def has_segments(model):
+    """
+    Whether a model's results have timestamped segments, which streaming
+    transcription needs to commit text while recording. ONNX decodes whole windows
+    """
+    return getattr(model, "engine", None) != "onnx"
+
+def decode_options(profile):
+    """A copy of the transcribe options of a decode profile, the default one if the name is unknown"""
+    return dict(DECODE_PROFILES.get(profile) or DECODE_PROFILES[DEFAULT_PROFILE])
+
+def language_options(spoken_language="auto"):
+    """
+    The language option for transcribe. A fixed language skips whisper's
+    detection pass; with "auto" it runs until one utterance has been detected
+    """
+    if spoken_language and spoken_language != "auto":
+        return {"language": spoken_language}
+    return {"language": detected_language} if detected_language else {}
+
+def speech_language(result):
+    """
+    The language of a transcription, or None if it heard no speech: whisper
+    reports some language for silence and noise too
+    """
+    if not result.get("language") or not result.get("text", "").strip():
+        return None
+    segments = result.get("segments") or []
+    if segments and all(segment.get("no_speech_prob", 0) > NO_SPEECH_THRESHOLD for segment in segments):
+        return None
+    return result["language"]
+
+def remember_language(result):
+    """Keep the language of the first transcription with speech for the session"""
+    global detected_language
+    language = speech_language(result)
+    if detected_language is None and language:
+        detected_language = language
+        print(f"Detected spoken language: {detected_language}")
+
+def whisper_cache_dir():
+    """whisper's own download directory, where converted models are cached too"""
+    return os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "whisper")
+
+def quantized_path(model_name):
+    """Where the int8 model is cached, next to whisper's own downloads"""
+    import torch
+    cache_dir = whisper_cache_dir()
+    # a pickled quantized model is tied to the torch version that made it
+    return os.path.join(cache_dir, f"{model_name}-int8-torch{torch.__version__.split('+')[0]}.pt")
+
+def load_quantized(model_name):
+    """
+    The PyTorch whisper model with dynamic int8 quantization of its linear
+    layers, for CPU decoding. The first load quantizes the fp32 model and
+    saves the result; later loads read the saved model directly.
+    """
+    import torch
+    import whisper
+    path = quantized_path(model_name)
+    if os.path.exists(path):
+        try:
+            return torch.load(path, weights_only=False)
+        except Exception as e:
+            print(f"Error loading quantized model {path}, quantizing again: {e}")
+
+    model = whisper.load_model(model_name, device="cpu")
+    for module in model.modules():
+        # whisper's Linear only adds a dtype cast, which is a no-op for fp32 on the CPU,
+        # and quantize_dynamic only converts plain nn.Linear
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # pool workers may quantize the same model at once
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(model, temp_path)
+    os.replace(temp_path, path)
+    return model
+
+def as_float32(audio):
+    """float32 16 kHz samples from an array or an audio file name"""
+    if isinstance(audio, str):
+        import transcribe
+        return transcribe.frames_to_float32(transcribe.load_audio_frames(audio))
+    import numpy as np
+    return np.asarray(audio, dtype=np.float32)
+
+
+class CTranslate2Engine:
+    """Whisper converted to CTranslate2 and run with int8 weights through faster-whisper"""
+
+    engine = "ctranslate2"
+
+    # whisper options faster-whisper understands under the same name
+    OPTIONS = ("language", "task", "initial_prompt", "temperature", "beam_size", "best_of",
+               "condition_on_previous_text", "without_timestamps", "no_speech_threshold")
+
+    def __init__(self, model_name, threads=0, compute_type="int8"):
+        from faster_whisper import WhisperModel
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.model = WhisperModel(CTRANSLATE2_NAMES.get(model_name, model_name), device="cpu",
+                                  compute_type=compute_type, cpu_threads=threads)
+
+    def size_mb(self):
+        import model_cache
+        # int8 weights take a quarter of the fp32 size, 16-bit ones half
+        return model_cache.MODEL_SIZES_MB.get(self.model_name, 0) / (4 if "int8" in self.compute_type else 2 if "16" in self.compute_type else 1)
+
+    def transcribe(self, audio, **options):
+        options = {key: value for key, value in options.items() if key in self.OPTIONS and value is not None}
+        # faster-whisper defaults to 5 beams and 5 samples, whisper's None is greedy with one sample
+        options.setdefault("beam_size", 1)
+        options.setdefault("best_of", 1)
+        if isinstance(options.get("temperature"), (int, float)):
+            options["temperature"] = [options["temperature"]]
+        segments, info = self.model.transcribe(as_float32(audio), **options)
+        segments = list(segments)
+        return {
+            "text": "".join(segment.text for segment in segments),
+            "language": info.language,
+            "segments": [{"start": segment.start, "end": segment.end, "text": segment.text}
+                         for segment in segments],
+        }
+
+
+class OnnxEngine:
+    """Whisper exported to ONNX and run with ONNX Runtime on the CPU through optimum"""
+
+    engine = "onnx"
+
+    def __init__(self, model_name, threads=0):
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+        from transformers import WhisperProcessor
+        model_id = f"openai/whisper-{HF_NAMES.get(model_name, model_name)}"
+        self.model_name = model_name
+        session_options = onnxruntime.SessionOptions()
+        if threads:
+            session_options.intra_op_num_threads = threads
+        self.processor = WhisperProcessor.from_pretrained(model_id)
+        path = os.path.join(whisper_cache_dir(), f"{model_name}-onnx")
+        if not os.path.isdir(path):
+            # from_pretrained exports into a temporary directory, so save the export once
+            model = ORTModelForSpeechSeq2Seq.from_pretrained(model_id, export=True)
+            # pool workers may export the same model at once
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            model.save_pretrained(temp_path)
+            try:
+                os.replace(temp_path, path)
+            except OSError:
+                # another process saved it first
+                shutil.rmtree(temp_path, ignore_errors=True)
+        self.model = ORTModelForSpeechSeq2Seq.from_pretrained(path, provider="CPUExecutionProvider",
+                                                              session_options=session_options)
+
+    def size_mb(self):
+        import model_cache
+        return model_cache.MODEL_SIZES_MB.get(self.model_name, 0)
+
+    def transcribe(self, audio, language=None, initial_prompt=None, **options):
+        audio = as_float32(audio)
+        generate_args = {}
+        if language:
+            generate_args["language"] = language
+        if options.get("beam_size"):
+            generate_args["num_beams"] = options["beam_size"]
+        if initial_prompt:
+            generate_args["prompt_ids"] = self.processor.get_prompt_ids(initial_prompt, return_tensors="pt")
+        texts = []
+        segments = []
+        for start in range(0, max(1, len(audio)), WINDOW_SAMPLES):
+            window = audio[start:start + WINDOW_SAMPLES]
+            features = self.processor(window, sampling_rate=RATE, return_tensors="pt").input_features
+            tokens = self.model.generate(features, **generate_args)
+            text = self.processor.batch_decode(tokens, skip_special_tokens=True)[0]
+            if initial_prompt and text.startswith(" " + initial_prompt.strip()):
+                # generate returns the prompt in front of the transcription
+                text = text[len(initial_prompt.strip()) + 1:]
+            texts.append(text)
+            # one segment per window, generate does not return timestamps
+            segments.append({"start": start / RATE, "end": (start + len(window)) / RATE, "text": text})
+        return {"text": "".join(texts), "language": language, "segments": segments}
@@ -0,0 +1,323 @@
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+import send_to_bot
+
+# Per-request timeout in seconds, 0 waits forever
+DEFAULT_TIMEOUT = 60
+
+# One event loop on a daemon thread runs every async request
+loop = None
+loop_lock = threading.Lock()
+
+# Async clients are bound to the loop, so they are kept apart from send_to_bot.clients
+async_clients = {}
+
+
+class RequestCancelled(Exception):
+    """The request was cancelled before the model finished answering"""
+
+
+def get_loop():
+    """Start the background event loop on first use"""
+    global loop
+    with loop_lock:
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="async-bot", daemon=True).start()
+    return loop
+
+def get_async_client(provider, key, model_id=None):
+    """Shared async client for provider and key, only called on the loop thread"""
+    if provider == "Gemini":
+        # a Gemini client is bound to one model
+        model_id = model_id or send_to_bot.GEMINI_MODEL
+    else:
+        model_id = None
+    client = async_clients.get((provider, key, model_id))
+    if client is None:
+        if provider == "Claude":
+            import anthropic
+            import httpx
+            http_client = anthropic.DefaultAsyncHttpxClient(
+                http2=send_to_bot.HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=300)
+            )
+            client = anthropic.AsyncAnthropic(api_key=key, base_url=send_to_bot.CLAUDE_BASE_URL,
+                                              http_client=http_client)
+        elif provider == "Gemini":
+            import google.generativeai as genai
+            with send_to_bot.clients_lock:
+                send_to_bot.configure_gemini(key)
+            client = genai.GenerativeModel(model_id)
+        else:
+            raise ValueError(f"Unknown provider: {provider}")
+        async_clients[(provider, key, model_id)] = client
+    if provider == "Gemini":
+        with send_to_bot.clients_lock:
+            send_to_bot.configure_gemini(key)
+    return client
+
+async def warm_up(provider, key):
+    """Open the async client's connection ahead of the first dictation, like send_to_bot.warm_up"""
+    try:
+        client = get_async_client(provider, key)
+        if provider == "Claude":
+            await client.models.list(limit=1)
+        elif provider == "Gemini":
+            await client.count_tokens_async("warm up")
+        return True
+    except Exception as e:
+        print(f"Error warming up async {provider} client: {e}")
+        return False
+
+def request_prompt(language, code="", edit_mode=False):
+    sys_prompt = send_to_bot.system_prompt(language)
+    if edit_mode and code:
+        import edits
+        sys_prompt = edits.edit_prompt(sys_prompt)
+    return sys_prompt
+
+async def send_text(text, model, key, language, code="", edit_mode=False, model_id=None, check_cache=True):
+    """
+    Async version of send_text, sharing its prompt and response cache.
+    model_id overrides the provider's default model, and with model RACE
+    key maps each provider to its API key (see race). check_cache=False
+    skips the cache lookup, the response is still stored
+    """
+    if model == RACE:
+        return await race(text, key, language, code, edit_mode)
+    sys_prompt = request_prompt(language, code, edit_mode)
+    tier, model_id, max_tokens = send_to_bot.route(model, text, code, edit_mode, model_id)
+    cache_key, response = send_to_bot.cached_response(model, sys_prompt, language, text, code, model_id,
+                                                      check_cache)
+    if response is not None:
+        return response
+
+    start = time.perf_counter()
+    response = await ask(text, model, key, sys_prompt, code, model_id, max_tokens)
+    if tier:
+        truncated = send_to_bot.last_stop_reason == "max_tokens"
+        send_to_bot.record_route(tier, start, truncated)
+        if truncated:
+            import router
+            model_id = router.TIERS["large"][model]
+            start = time.perf_counter()
+            response = await ask(text, model, key, sys_prompt, code, model_id, router.MAX_TOKENS)
+            send_to_bot.record_route("large", start, send_to_bot.last_stop_reason == "max_tokens")
+            cache_key = send_to_bot.cached_response(model, sys_prompt, language, text, code, model_id)[0]
+    if cache_key:
+        send_to_bot.get_response_cache().put(cache_key, response)
+    return response
+
+async def ask(text, model, key, sys_prompt, code, model_id=None, max_tokens=None):
+    """One request to a provider, without caching or routing"""
+    if model == "Claude":
+        client = get_async_client("Claude", key)
+        message = await client.messages.create(
+            **send_to_bot.claude_message_args(text, sys_prompt, code, model_id, max_tokens))
+        send_to_bot.record_usage(message.usage, stop_reason=message.stop_reason)
+        return message.content[0].text
+    if model == "Gemini":
+        client = get_async_client("Gemini", key, model_id)
+        response = await client.generate_content_async(
+            contents=sys_prompt + code + text,
+            generation_config=send_to_bot.gemini_generation_config(max_tokens))
+        send_to_bot.record_gemini_usage(response)
+        return response.text
+    raise ValueError(f"Unknown provider: {model}")
+
+async def stream_text(text, model, key, language, on_chunk, code=""):
+    """Async version of stream_text, passing chunks to on_chunk on the loop thread"""
+    if model == RACE:
+        # only the winner is known once it has finished, so a race is not streamed
+        response = await race(text, key, language, code)
+        on_chunk(response)
+        return response
+    if model not in send_to_bot.MODEL_IDS:
+        raise ValueError(f"Unknown provider: {model}")
+    sys_prompt = send_to_bot.system_prompt(language)
+    tier, model_id, max_tokens = send_to_bot.route(model, text, code, streamed=True)
+    cache_key, response = send_to_bot.cached_response(model, sys_prompt, language, text, code, model_id)
+    if response is not None:
+        on_chunk(response)
+        return response
+
+    pieces = []
+    start = time.perf_counter()
+    if model == "Claude":
+        client = get_async_client("Claude", key)
+        first_token_s = None
+        message_args = send_to_bot.claude_message_args(text, sys_prompt, code, model_id, max_tokens)
+        async with client.messages.stream(**message_args) as stream:
+            async for chunk in stream.text_stream:
+                if first_token_s is None:
+                    first_token_s = time.perf_counter() - start
+                pieces.append(chunk)
+                on_chunk(chunk)
+            message = await stream.get_final_message()
+            send_to_bot.record_usage(message.usage, first_token_s, message.stop_reason)
+    if model == "Gemini":
+        client = get_async_client("Gemini", key, model_id)
+        response = await client.generate_content_async(
+            contents=sys_prompt + code + text,
+            generation_config=send_to_bot.gemini_generation_config(max_tokens),
+            stream=True)
+        async for chunk in response:
+            pieces.append(chunk.text)
+            on_chunk(chunk.text)
+        send_to_bot.record_gemini_usage(response)
+    truncated = send_to_bot.last_stop_reason == "max_tokens"
+    if tier:
+        send_to_bot.record_route(tier, start, truncated)
+    if cache_key and pieces and not truncated:
+        send_to_bot.get_response_cache().put(cache_key, "".join(pieces))
+    return "".join(pieces)
+
+async def with_timeout(coro, timeout):
+    if not timeout:
+        return await coro
+    return await asyncio.wait_for(coro, timeout)
+
+def submit(coro, timeout=DEFAULT_TIMEOUT):
+    """Schedule a request on the background loop, returning a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(with_timeout(coro, timeout), get_loop())
+
+def run(coro, cancel_event=None, timeout=DEFAULT_TIMEOUT, poll=0.05):
+    """
+    Run a request on the background loop and wait for it.
+    Setting cancel_event cancels the request task, which closes its
+    connection so the provider stops generating. Raises RequestCancelled
+    when cancelled and TimeoutError after timeout seconds.
+    """
+    future = submit(coro, timeout)
+    while not future.done():
+        if cancel_event is not None and cancel_event.is_set():
+            future.cancel()
+            raise RequestCancelled("Request cancelled")
+        concurrent.futures.wait([future], timeout=poll)
+    try:
+        return future.result()
+    except concurrent.futures.CancelledError:
+        raise RequestCancelled("Request cancelled")
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"No response within {timeout}s")
+
+def cancel_all():
+    """Cancel every request still running on the background loop"""
+    if loop is None:
+        return 0
+    async def cancel():
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+    return asyncio.run_coroutine_threadsafe(cancel(), loop).result()
+
+# Race mode: the same prompt goes to every contestant, the first valid answer wins
+RACE = "Race"
+# (provider, model id) pairs, None is the provider's default model; several
+# Claude models can race each other, e.g. [("Claude", "claude-3-5-haiku-latest"), ("Claude", None)]
+RACE_CONTESTANTS = [("Claude", None), ("Gemini", None)]
+RACE_LOG = "race_log.jsonl"
+race_stats = {}
+
+def contestant_name(provider, model_id):
+    return f"{provider}:{model_id}" if model_id else provider
+
+async def race(text, keys, language, code="", edit_mode=False, contestants=None):
+    """
+    Send the prompt to every contestant with a key in keys (provider -> API key)
+    and return the first non-empty response, cancelling the others.
+    Failed contestants are skipped; if all of them fail the errors are raised.
+    """
+    contestants = [(provider, model_id) for provider, model_id in (contestants or RACE_CONTESTANTS)
+                   if keys.get(provider)]
+    if not contestants:
+        raise ValueError("No API key for any race contestant")
+
+    # a cached response would win in no time and skew the stats, so it is served without a race
+    sys_prompt = request_prompt(language, code, edit_mode)
+    for provider, model_id in contestants:
+        routed_id = send_to_bot.route(provider, text, code, edit_mode, model_id)[1]
+        response = send_to_bot.cached_response(provider, sys_prompt, language, text, code, routed_id)[1]
+        if response is not None:
+            return response
+
+    start = time.perf_counter()
+    tasks = {
+        asyncio.ensure_future(send_text(text, provider, keys[provider], language, code, edit_mode, model_id,
+                                        check_cache=False)):
+            contestant_name(provider, model_id)
+        for provider, model_id in contestants
+    }
+    pending = set(tasks)
+    winner = response = None
+    latencies = {}
+    errors = {}
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            finished = time.perf_counter() - start
+            for task in done:
+                name = tasks[task]
+                latencies[name] = finished
+                if task.exception() is not None:
+                    errors[name] = repr(task.exception())
+                elif not task.result().strip():
+                    errors[name] = "empty response"
+                elif winner is None:
+                    winner, response = name, task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    record_race([tasks[task] for task in tasks], winner, latencies, errors)
+    if winner is None:
+        raise RuntimeError(f"Every race contestant failed: {errors}")
+    return response
+
+def record_race(names, winner, latencies, errors):
+    """Update the win and latency stats and append the race to RACE_LOG"""
+    for name in names:
+        stats = race_stats.setdefault(name, {"races": 0, "wins": 0, "errors": 0, "latencies": []})
+        stats["races"] += 1
+        stats["wins"] += name == winner
+        stats["errors"] += name in errors
+        if name in latencies and name not in errors:
+            stats["latencies"].append(latencies[name])
+    print(f"Race won by {winner} in {latencies.get(winner, 0):.2f}s, errors: {errors or 'none'}")
+    print("Race win rates: " + ", ".join(f"{name} {summary['win_rate']:.0%} (p50 {summary['p50_s']:.2f}s)"
+                                        for name, summary in race_summary().items()))
+    entry = {"time": time.time(), "contestants": names, "winner": winner, "latencies": latencies, "errors": errors}
+    # file I/O on the loop thread would stall every request in flight
+    asyncio.get_running_loop().run_in_executor(None, write_race_log, entry)
+
+def write_race_log(entry):
+    try:
+        with open(RACE_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError as e:
+        print(f"Error writing race log: {e}")
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+def race_summary():
+    """
+    Win rate and latency percentiles per contestant. Losers are cancelled,
+    so their latencies only cover the races they finished, e.g. after an error
+    """
+    return {
+        name: {
+            "races": stats["races"],
+            "win_rate": stats["wins"] / stats["races"] if stats["races"] else 0.0,
+            "errors": stats["errors"],
+            "p50_s": percentile(stats["latencies"], 0.5),
+            "p90_s": percentile(stats["latencies"], 0.9),
+        }
+        for name, stats in race_stats.items()
+    }
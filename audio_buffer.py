@@ -0,0 +1,77 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class AudioBuffer:
+    """
+    Growable int16 arena for captured audio.
+
+    Chunks are copied into one preallocated NumPy array that doubles when it
+    fills up, instead of being kept as separate bytes objects and joined at
+    the end. samples() and view() return zero-copy views that whisper, the
+    VAD and the WAV writer can read directly.
+
+    There is a single writer (the capture loop). Readers on other threads may
+    call view() while it writes: length is only advanced after the data is in
+    place, and a view taken before the arena grows keeps the old array alive.
+    """
+
+    def __init__(self, initial_seconds=60):
+        self.data = np.empty(int(initial_seconds * SAMPLE_RATE), dtype=np.int16)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def seconds(self):
+        return self.length / SAMPLE_RATE
+
+    def reserve(self, count):
+        """Make room for count more samples"""
+        needed = self.length + count
+        if needed <= self.data.size:
+            return
+        size = max(self.data.size * 2, needed)
+        grown = np.empty(size, dtype=np.int16)
+        grown[:self.length] = self.data[:self.length]
+        self.data = grown
+
+    def write(self, data):
+        """Copy a chunk of int16 bytes (or samples) onto the end of the buffer"""
+        samples = np.frombuffer(data, dtype=np.int16) if not isinstance(data, np.ndarray) else data
+        count = samples.size
+        self.reserve(count)
+        self.data[self.length:self.length + count] = samples
+        self.length += count
+
+    def writable(self, count):
+        """
+        Writable view of the next count samples, for readinto-style sources.
+        Call commit() with the number of samples actually filled.
+        """
+        self.reserve(count)
+        return self.data[self.length:self.length + count]
+
+    def commit(self, count):
+        self.length += count
+
+    def view(self, start=0, end=None):
+        """Zero-copy view of samples[start:end]"""
+        length = self.length
+        data = self.data
+        end = length if end is None else min(end, length)
+        return data[start:end]
+
+    def samples(self):
+        return self.view()
+
+    def float32(self, start=0, end=None):
+        """Samples scaled to [-1, 1) as whisper expects"""
+        audio = self.view(start, end).astype(np.float32)
+        audio /= 32768.0
+        return audio
+
+    def clear(self):
+        self.length = 0
@@ -0,0 +1,189 @@
+import abc
+import queue
+import threading
+import time
+import numpy as np
+
+CHUNK = 1024 * 8
+RATE = 16000
+
+
+class AudioSource:
+    """
+    A source of 16 kHz mono int16 audio chunks.
+
+    Producers call push() from their own thread (PortAudio's callback thread,
+    a file reader, a generator); the capture loop calls read(). Chunks go
+    through a SimpleQueue, so the producer never waits on the consumer. If
+    more than max_queued chunks pile up the oldest are dropped and counted.
+    """
+
+    def __init__(self, chunk=CHUNK, max_queued=64):
+        self.chunk = chunk
+        self.max_queued = max_queued
+        self.queue = queue.SimpleQueue()
+        self.finished = threading.Event()
+
+        self.chunks = 0
+        self.samples = 0
+        self.overruns = 0
+        self.dropped = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.started_at = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def stop(self):
+        self.finished.set()
+
+    def push(self, data):
+        if self.queue.qsize() >= self.max_queued:
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+        self.queue.put((data, time.perf_counter()))
+
+    def read(self, timeout=None):
+        """Next chunk of int16 bytes, or None on timeout or once the source is exhausted"""
+        try:
+            data, pushed_at = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        latency = time.perf_counter() - pushed_at
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.chunks += 1
+        self.samples += len(data) // 2
+        return data
+
+    @property
+    def exhausted(self):
+        return self.finished.is_set() and self.queue.empty()
+
+    def metrics(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            "chunks": self.chunks,
+            "seconds": self.samples / RATE,
+            "overruns": self.overruns,
+            "dropped_chunks": self.dropped,
+            "queue_latency_ms": self.latency_total / self.chunks * 1000 if self.chunks else 0.0,
+            "queue_latency_max_ms": self.latency_max * 1000,
+            "realtime_factor": self.samples / RATE / elapsed if elapsed else 0.0,
+        }
+
+
+class PyAudioSource(AudioSource):
+    """Microphone capture with PyAudio in callback (non-blocking) mode, input only"""
+
+    def __init__(self, chunk=CHUNK, max_queued=64, device_index=None):
+        super().__init__(chunk, max_queued)
+        self.device_index = device_index
+        self.p = None
+        self.stream = None
+
+    def start(self):
+        import pyaudio
+        self.pyaudio = pyaudio
+        self.p = pyaudio.PyAudio()
+        self.stream = self.p.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=RATE,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=self.chunk,
+            stream_callback=self._callback
+        )
+        super().start()
+        self.stream.start_stream()
+        return self
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & self.pyaudio.paInputOverflow:
+            self.overruns += 1
+        self.push(in_data)
+        return (None, self.pyaudio.paContinue)
+
+    def stop(self):
+        if self.stream:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.p:
+            self.p.terminate()
+            self.p = None
+        super().stop()
+
+
+class ThreadedSource(AudioSource, abc.ABC):
+    """Base for sources that produce chunks on their own thread, optionally paced in real time"""
+
+    def __init__(self, chunk=CHUNK, max_queued=64, realtime=True):
+        super().__init__(chunk, max_queued)
+        self.realtime = realtime
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        super().start()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread.is_alive() and threading.current_thread() is not self.thread:
+            self.thread.join()
+        super().stop()
+
+    @abc.abstractmethod
+    def chunks_to_send(self):
+        """The int16 chunks to send, in order"""
+
+    def _run(self):
+        next_time = time.perf_counter()
+        for data in self.chunks_to_send():
+            if self.stopping.is_set():
+                break
+            if self.realtime:
+                # a real device delivers a chunk once it has been fully recorded
+                next_time += len(data) / 2 / RATE
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            self.push(data)
+        self.finished.set()
+
+
+class FileSource(ThreadedSource):
+    """Replays an audio file as if it were being recorded"""
+
+    def __init__(self, filename, chunk=CHUNK, max_queued=64, realtime=True):
+        super().__init__(chunk, max_queued, realtime)
+        self.filename = filename
+
+    def chunks_to_send(self):
+        import transcribe
+        return transcribe.load_audio_frames(self.filename, self.chunk)
+
+
+class SyntheticSource(ThreadedSource):
+    """Generates a noisy tone, for testing capture without audio hardware"""
+
+    def __init__(self, seconds=10.0, frequency=220.0, chunk=CHUNK, max_queued=64, realtime=True):
+        super().__init__(chunk, max_queued, realtime)
+        self.seconds = seconds
+        self.frequency = frequency
+
+    def chunks_to_send(self):
+        rng = np.random.default_rng(0)
+        total = int(self.seconds * RATE)
+        for start in range(0, total, self.chunk):
+            t = np.arange(start, min(start + self.chunk, total)) / RATE
+            signal = 0.3 * np.sin(2 * np.pi * self.frequency * t) + 0.05 * rng.standard_normal(t.size)
+            yield (signal * 32767).astype(np.int16).tobytes()
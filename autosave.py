@@ -0,0 +1,110 @@
+import os
+import tempfile
+import threading
+import time
+
+
+def atomic_write(path, data):
+    """Write data to path through a temp file and rename, so a crash never leaves a half-written file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class Autosaver:
+    """
+    Writes files on a background thread.
+
+    save() only records the latest content for a path; the worker writes it
+    once no new save for that path has arrived for delay seconds, so a burst
+    of edits becomes a single write. snapshot() additionally keeps the last
+    keep_snapshots versions of the editor buffer in snapshot_dir for crash
+    recovery. Errors are passed to on_error instead of being raised.
+    """
+
+    def __init__(self, delay=1.0, snapshot_dir="recovery", keep_snapshots=5, snapshot_interval=30.0,
+                 on_error=None):
+        self.delay = delay
+        self.snapshot_dir = snapshot_dir
+        self.keep_snapshots = keep_snapshots
+        self.snapshot_interval = snapshot_interval
+        self.on_error = on_error
+        self.pending = {}
+        self.last_snapshot = 0.0
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def save(self, path, data):
+        with self.condition:
+            self.pending[path] = (data, time.monotonic())
+            self.condition.notify()
+
+    def snapshot(self, data):
+        """Keep a recovery copy of the buffer, at most once per snapshot_interval"""
+        now = time.monotonic()
+        if now - self.last_snapshot < self.snapshot_interval:
+            return
+        self.last_snapshot = now
+        name = time.strftime("buffer-%Y%m%d-%H%M%S.txt")
+        self.save(os.path.join(self.snapshot_dir, name), data)
+
+    def flush(self):
+        """Write everything that is pending right away"""
+        with self.condition:
+            pending, self.pending = self.pending, {}
+        for path, (data, _) in pending.items():
+            self._write(path, data)
+
+    def close(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                now = time.monotonic()
+                due = {path: entry for path, entry in self.pending.items() if now - entry[1] >= self.delay}
+                if not due:
+                    wait = min(entry[1] for entry in self.pending.values()) + self.delay - now
+                    self.condition.wait(wait)
+                    continue
+                for path in due:
+                    del self.pending[path]
+            for path, (data, _) in due.items():
+                self._write(path, data)
+
+    def _write(self, path, data):
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            atomic_write(path, data)
+            if directory and os.path.abspath(directory) == os.path.abspath(self.snapshot_dir):
+                self._prune_snapshots()
+        except Exception as e:
+            print(f"Error saving {path}: {e}")
+            if self.on_error:
+                self.on_error(path, e)
+
+    def _prune_snapshots(self):
+        snapshots = sorted(name for name in os.listdir(self.snapshot_dir) if name.startswith("buffer-"))
+        for name in snapshots[:-self.keep_snapshots]:
+            os.unlink(os.path.join(self.snapshot_dir, name))
@@ -0,0 +1,209 @@
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import asr_engines
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".webm")
+KEY_VARIABLES = {"Claude": "ANTHROPIC_API_KEY", "Gemini": "GEMINI_API_KEY"}
+
+
+def find_audio_files(inputs):
+    """Audio files in the given directories and globs, sorted and without duplicates"""
+    files = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for directory, _, names in os.walk(pattern):
+                files.update(os.path.join(directory, name) for name in names
+                             if name.lower().endswith(AUDIO_EXTENSIONS))
+        else:
+            files.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(os.path.abspath(path) for path in files)
+
+def load_done(output):
+    """Files that already have a result without an error in output"""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line of an interrupted run may be cut off
+                continue
+            if not record.get("error"):
+                done.add(record["file"])
+    return done
+
+class ResultWriter:
+    """Appends one JSON line per file and flushes it straight away"""
+
+    def __init__(self, output):
+        self.file = open(output, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.written = 0
+
+    def write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+            self.written += 1
+
+    def close(self):
+        self.file.close()
+
+def load_file(path):
+    import transcribe
+    start = time.perf_counter()
+    samples = transcribe.as_samples(transcribe.load_audio_frames(path))
+    return samples, time.perf_counter() - start
+
+def run(args):
+    import transcribe
+
+    files = find_audio_files(args.inputs)
+    done = load_done(args.output)
+    todo = [path for path in files if path not in done]
+    print(f"{len(files)} files, {len(files) - len(todo)} already done, {len(todo)} to process")
+    if not todo:
+        return
+
+    start = time.perf_counter()
+    if args.workers:
+        import whisper_pool
+        model = whisper_pool.WhisperPool(args.model, args.workers, args.threads or None, args.engine, args.quantize)
+        model.wait_ready()
+        print(f"Loaded {args.model} in {model.workers} worker(s) x {model.threads_per_worker} thread(s) "
+              f"in {time.perf_counter() - start:.1f}s")
+    else:
+        model = asr_engines.load_engine(args.engine, args.model, args.threads, args.quantize)
+        print(f"Loaded {args.model} in {time.perf_counter() - start:.1f}s")
+
+    decode_options = asr_engines.decode_options(args.profile)
+    code = ""
+    if args.code:
+        with open(args.code, encoding="utf-8") as f:
+            code = f.read()
+    key = args.key or os.environ.get(KEY_VARIABLES.get(args.llm, ""), "")
+    if args.llm != "none":
+        import async_bot
+        import send_to_bot
+        send_to_bot.CACHE_ENABLED = not args.no_cache
+        send_to_bot.ROUTING_ENABLED = args.route
+
+    writer = ResultWriter(args.output)
+    # bounds the LLM requests in flight; decoding waits when the limit is reached
+    in_flight = threading.BoundedSemaphore(args.concurrency)
+
+    def finish(record, started, future=None):
+        if future is not None:
+            try:
+                record["response"] = send_to_bot.strip_fences(future.result())
+            except Exception as e:
+                record["error"] = f"LLM error: {e}"
+            record["timings"]["llm_s"] = time.perf_counter() - started
+        writer.write(record)
+        print(f"[{writer.written}/{len(todo)}] {record['file']}"
+              + (f" ERROR {record['error']}" if record.get("error") else ""))
+        if future is not None:
+            in_flight.release()
+
+    def process(path, load):
+        record = {"file": path, "model": args.model, "engine": args.engine, "profile": args.profile,
+                  "llm": args.llm, "transcript": None, "response": None, "error": None, "timings": {}}
+        try:
+            samples, record["timings"]["load_s"] = load.result()
+            record["timings"]["audio_s"] = len(samples) / transcribe.RATE
+            if args.remove_silence:
+                samples, _ = transcribe.trim_silence(samples)
+            started = time.perf_counter()
+            # with auto the first file's detected language is used for the rest
+            options = dict(decode_options, **asr_engines.language_options(args.spoken_language))
+            record["transcript"] = transcribe.transcribe_audio(samples, model, decode_options=options)
+            record["timings"]["asr_s"] = time.perf_counter() - started
+            if record["transcript"].startswith("Transcription error"):
+                record["error"] = record["transcript"]
+        except Exception as e:
+            record["error"] = f"Transcription error: {e}"
+
+        if args.llm == "none" or record["error"]:
+            finish(record, None)
+            return
+        in_flight.acquire()
+        started = time.perf_counter()
+        future = async_bot.submit(
+            async_bot.send_text(record["transcript"], args.llm, key, args.language, code),
+            args.timeout)
+        future.add_done_callback(lambda future, record=record, started=started:
+                                 finish(record, started, future))
+
+    # the next files are loaded and resampled on worker threads while the model decodes;
+    # with worker processes one file per worker is decoded at a time
+    with ThreadPoolExecutor(max_workers=args.prefetch) as loader, \
+            ThreadPoolExecutor(max_workers=max(1, args.workers)) as decoders:
+        loads = {}
+        decoding = []
+        for index in range(min(args.batch_size, len(todo))):
+            loads[index] = loader.submit(load_file, todo[index])
+        for index, path in enumerate(todo):
+            if index + args.batch_size < len(todo):
+                loads[index + args.batch_size] = loader.submit(load_file, todo[index + args.batch_size])
+            load = loads.pop(index)
+            if not args.workers:
+                process(path, load)
+                continue
+            if len(decoding) >= args.workers:
+                decoding.pop(0).result()
+            decoding.append(decoders.submit(process, path, load))
+        for future in decoding:
+            future.result()
+
+    # every slot is free again once the last result has been written
+    for _ in range(args.concurrency):
+        in_flight.acquire()
+    writer.close()
+    if args.workers:
+        model.close()
+    print(f"Wrote {writer.written} results to {args.output}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Transcribe recorded dictations with one whisper model and optionally send them to the LLM. "
+                    "Results are appended to the output file one line per file, and files that already "
+                    "have a result there are skipped, so an interrupted run can simply be started again."
+    )
+    parser.add_argument("inputs", nargs="+", help="audio files, directories or glob patterns")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file to append results to")
+    parser.add_argument("--model", default="turbo", help="whisper model")
+    parser.add_argument("--engine", default="pytorch", choices=asr_engines.ENGINES,
+                        help="speech recognition backend (see asr_engines.py)")
+    parser.add_argument("--quantize", action="store_true", help="dynamic int8 quantization of the PyTorch model")
+    parser.add_argument("--profile", default=asr_engines.DEFAULT_PROFILE,
+                        choices=list(asr_engines.DECODE_PROFILES),
+                        help="whisper decode profile (see asr_engines.DECODE_PROFILES)")
+    parser.add_argument("--spoken-language", default="auto",
+                        help="whisper language code of the dictations, auto detects it on the first file")
+    parser.add_argument("--llm", default="none", choices=["none", "Claude", "Gemini"],
+                        help="send each transcript to this LLM")
+    parser.add_argument("--key", default=None, help="API key, defaults to ANTHROPIC_API_KEY / GEMINI_API_KEY")
+    parser.add_argument("--language", default="Python", help="programming language for the LLM prompt")
+    parser.add_argument("--code", default=None, help="file with code to send along with every transcript")
+    parser.add_argument("--concurrency", type=int, default=4, help="LLM requests in flight at once")
+    parser.add_argument("--batch-size", type=int, default=8, help="files loaded ahead of the decoder")
+    parser.add_argument("--prefetch", type=int, default=2, help="threads loading audio files")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="decode in this many worker processes, 0 decodes in this process")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads per worker, 0 splits the cores")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per LLM request, 0 for none")
+    parser.add_argument("--remove-silence", action="store_true", help="trim non-speech before decoding")
+    parser.add_argument("--route", action="store_true", help="route LLM requests by complexity")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the response cache")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
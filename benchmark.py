@@ -0,0 +1,898 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import transcribe
+
+
+def synthetic_frames(seconds, chunk=transcribe.CHUNK):
+    """Build int16 chunks of noisy tones, shaped like a capture from stream.read"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * transcribe.RATE)) / transcribe.RATE
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * rng.standard_normal(t.size)
+    data = (signal * 32767).astype(np.int16).tobytes()
+    step = chunk * 2
+    return [data[i:i + step] for i in range(0, len(data), step)]
+
+
+def time_call(func, repeat=3):
+    """Best wall-clock time of func over repeat runs, in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_in_memory(args):
+    """Compare the temp WAV + ffmpeg input path against the in-memory array"""
+    import whisper
+
+    def via_wav(frames):
+        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
+            temp_filename = temp_file.name
+        try:
+            transcribe.write_wav(temp_filename, frames)
+            whisper.load_audio(temp_filename)
+        finally:
+            os.unlink(temp_filename)
+
+    model = whisper.load_model(args.model) if args.model else None
+
+    for seconds in args.durations:
+        frames = synthetic_frames(seconds)
+        wav_ms = time_call(lambda: via_wav(frames))
+        mem_ms = time_call(lambda: transcribe.frames_to_float32(frames))
+        print(f"{seconds:>4}s input   wav+ffmpeg {wav_ms:8.1f} ms   in-memory {mem_ms:8.1f} ms   "
+              f"saved {wav_ms - mem_ms:8.1f} ms")
+        if model:
+            wav_ms = time_call(lambda: transcribe.transcribe_audio(frames, model, in_memory=False), 1)
+            mem_ms = time_call(lambda: transcribe.transcribe_audio(frames, model), 1)
+            print(f"{seconds:>4}s full    wav+ffmpeg {wav_ms:8.1f} ms   in-memory {mem_ms:8.1f} ms   "
+                  f"saved {wav_ms - mem_ms:8.1f} ms")
+
+
+def bench_streaming(args):
+    """Time from end of audio to final text, batch vs streaming, for a WAV file"""
+    import whisper
+
+    if not args.wav:
+        print("streaming benchmark needs --wav")
+        return
+    model = whisper.load_model(args.model or "base")
+    wav = args.wav[0]
+    frames = transcribe.load_audio_frames(wav)
+
+    start = time.perf_counter()
+    batch_text = transcribe.transcribe_audio(frames, model)
+    batch_s = time.perf_counter() - start
+
+    stream_text, stream_s = transcribe.transcribe_wav_streaming(wav, model, realtime=not args.fast)
+    print(f"batch     {batch_s:6.2f} s after stop   {batch_text.strip()[:60]!r}")
+    print(f"streaming {stream_s:6.2f} s after stop   {stream_text.strip()[:60]!r}")
+
+
+def bench_llm_stream(args):
+    """Time to first visible code, blocking vs streamed, against the mock LLM server"""
+    import send_to_bot
+    from mock_llm_server import MockLLMServer
+
+    send_to_bot.CACHE_ENABLED = False
+    with MockLLMServer(first_token_delay=0.3, chunk_delay=0.05) as server:
+        send_to_bot.CLAUDE_BASE_URL = server.url
+        send_to_bot.GEMINI_ENDPOINT = server.url
+        for provider in ("Claude", "Gemini"):
+            start = time.perf_counter()
+            send_to_bot.send_text("write a for loop", provider, "mock-key", "Python")
+            blocking_ms = (time.perf_counter() - start) * 1000
+
+            first = []
+            start = time.perf_counter()
+            transcribe.stream_response("write a for loop", provider, "mock-key", "Python",
+                                       lambda chunk: first or first.append(time.perf_counter()))
+            total_ms = (time.perf_counter() - start) * 1000
+            first_ms = (first[0] - start) * 1000 if first else total_ms
+            print(f"{provider:<7} blocking {blocking_ms:7.1f} ms   streamed first chunk {first_ms:7.1f} ms   "
+                  f"streamed total {total_ms:7.1f} ms")
+
+
+def bench_vad(args):
+    """Audio removed by the VAD and decode time saved on recorded dictations"""
+    import whisper
+
+    if not args.wav:
+        print("vad benchmark needs --wav")
+        return
+    model = whisper.load_model(args.model) if args.model else None
+    for filename in args.wav:
+        frames = transcribe.load_audio_frames(filename)
+        trimmed, stats = transcribe.trim_silence(frames)
+        removed = stats["removed_seconds"] / stats["original_seconds"] * 100 if stats["original_seconds"] else 0
+        line = (f"{os.path.basename(filename):<30} {stats['original_seconds']:6.1f} s   "
+                f"removed {stats['removed_seconds']:6.1f} s ({removed:4.1f}%)")
+        if model:
+            full_ms = time_call(lambda: transcribe.transcribe_audio(frames, model), 1)
+            trimmed_ms = time_call(lambda: transcribe.transcribe_audio(trimmed, model), 1)
+            line += f"   decode {full_ms:8.1f} -> {trimmed_ms:8.1f} ms"
+        print(line)
+
+
+def bench_model_cache(args):
+    """Load/warm timings, first-decode latency and cache-hit switch time for whisper models"""
+    import model_cache
+
+    frames = synthetic_frames(5)
+    for warm in (False, True):
+        cache = model_cache.WhisperModelCache(args.cache_mb, warm=warm)
+        for name in args.models:
+            cache.get(name)
+            timings = cache.timings[name]
+            first_ms = time_call(lambda: transcribe.transcribe_audio(frames, cache.get(name)), 1)
+            print(f"{name:<7} warm={warm!s:<5} load {timings['load_s']:6.2f} s   "
+                  f"warm-up {timings['warm_s']:6.2f} s   first decode {first_ms:8.1f} ms")
+        for name in args.models:
+            hit_ms = time_call(lambda: cache.get(name))
+            state = "cached " if name in cache else "evicted"
+            print(f"{name:<7} switch back ({state}) {hit_ms:8.2f} ms")
+        cache.clear()
+
+
+def bench_capture(args):
+    """Memory and CPU of a long capture: list of bytes + join vs the AudioBuffer arena"""
+    import tracemalloc
+    import audio_buffer
+
+    seconds = args.capture_minutes * 60
+    chunk_bytes = transcribe.CHUNK * 2
+    source = synthetic_frames(10)[0]
+    chunks = int(seconds * transcribe.RATE / transcribe.CHUNK)
+
+    def read():
+        # stream.read hands back a new bytes object for every chunk
+        return bytes(source[:chunk_bytes])
+
+    def with_list():
+        recording = []
+        for _ in range(chunks):
+            recording.append(read())
+        return transcribe.frames_to_float32([b''.join(recording)])
+
+    def with_arena():
+        recording = audio_buffer.AudioBuffer()
+        for _ in range(chunks):
+            recording.write(read())
+        return recording.float32()
+
+    for label, func in (("list + join", with_list), ("AudioBuffer", with_arena)):
+        tracemalloc.start()
+        cpu = time.process_time()
+        start = time.perf_counter()
+        func()
+        wall_ms = (time.perf_counter() - start) * 1000
+        cpu_ms = (time.process_time() - cpu) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label:<12} {args.capture_minutes:g} min capture   peak {peak / 2**20:7.1f} MiB   "
+              f"cpu {cpu_ms:8.1f} ms   wall {wall_ms:8.1f} ms")
+
+
+def bench_sources(args):
+    """Throughput and queue latency of the capture sources, no audio hardware needed"""
+    import audio_sources
+
+    seconds = args.durations[0]
+    sources = [
+        ("synthetic, as fast as possible", audio_sources.SyntheticSource(seconds, realtime=False, max_queued=10**6)),
+        ("synthetic, real time", audio_sources.SyntheticSource(seconds)),
+    ]
+    if args.wav:
+        sources.append(("file, real time", audio_sources.FileSource(args.wav[0])))
+    for label, source in sources:
+        source.start()
+        while not source.exhausted:
+            source.read(timeout=0.5)
+        source.stop()
+        metrics = source.metrics()
+        print(f"{label:<32} {metrics['seconds']:6.1f} s audio   x{metrics['realtime_factor']:8.1f} real time   "
+              f"latency avg {metrics['queue_latency_ms']:6.2f} ms max {metrics['queue_latency_max_ms']:6.2f} ms   "
+              f"dropped {metrics['dropped_chunks']}")
+
+
+def bench_response_cache(args):
+    """Lookup latency of memory and SQLite hits and misses in the response cache"""
+    import statistics
+    import response_cache
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = response_cache.ResponseCache(os.path.join(directory, "cache.sqlite3"), memory_entries=100)
+        prompts = [f"write a for loop number {i}" for i in range(1000)]
+        keys = [response_cache.cache_key("model", "system", "Python", prompt) for prompt in prompts]
+        for key in keys:
+            cache.put(key, "for i in range(10):\n    print(i)\n")
+
+        def lookups(batch):
+            timings = []
+            for key in batch:
+                start = time.perf_counter()
+                cache.get(key)
+                timings.append((time.perf_counter() - start) * 1000)
+            return timings
+
+        memory = lookups(keys[-100:])
+        disk = lookups(keys[:100])
+        misses = lookups([response_cache.cache_key("model", "system", "Python", f"miss {i}") for i in range(100)])
+        for label, timings in (("memory hit", memory), ("sqlite hit", disk), ("miss", misses)):
+            print(f"{label:<11} median {statistics.median(timings):.4f} ms   max {max(timings):.4f} ms")
+        print(cache.stats())
+        cache.close()
+
+
+def bench_prompt_cache(args):
+    """Billed input tokens and time to first token over an iterative editing session (needs ANTHROPIC_API_KEY)"""
+    import send_to_bot
+
+    key = os.environ.get("ANTHROPIC_API_KEY")
+    if not key:
+        print("prompt-cache benchmark needs ANTHROPIC_API_KEY")
+        return
+    send_to_bot.CACHE_ENABLED = False
+    # a file large enough to pass the minimum cacheable prompt length
+    code = "".join(f"def helper_{i}(values):\n    return [v * {i} for v in values]\n\n" for i in range(80))
+    edits = ["add a main function", "add a docstring to helper_1", "rename helper_2 to double", "add type hints"]
+    for turn, edit in enumerate(edits, 1):
+        code = "".join(send_to_bot.stream_text(" " + edit, "Claude", key, "Python", code))
+        usage = send_to_bot.last_usage
+        print(f"turn {turn}: input {usage['input_tokens']:6d}   cache write {usage['cache_creation_input_tokens']:6d}   "
+              f"cache read {usage['cache_read_input_tokens']:6d}   first token {usage.get('first_token_s', 0):5.2f} s")
+
+
+def bench_edit_mode(args):
+    """Output tokens and latency of full rewrites vs search/replace edits by file size (needs ANTHROPIC_API_KEY)"""
+    import send_to_bot
+
+    key = os.environ.get("ANTHROPIC_API_KEY")
+    if not key:
+        print("edit-mode benchmark needs ANTHROPIC_API_KEY")
+        return
+    send_to_bot.CACHE_ENABLED = False
+    for functions in (5, 20, 60):
+        code = "".join(f"def helper_{i}(values):\n    return [v * {i} for v in values]\n\n" for i in range(functions))
+        for edit_mode in (False, True):
+            start = time.perf_counter()
+            if edit_mode:
+                transcribe.request_edit(" rename helper_1 to triple", "Claude", key, "Python", code)
+            else:
+                send_to_bot.send_text(" rename helper_1 to triple", "Claude", key, "Python", code)
+            elapsed = time.perf_counter() - start
+            label = "edits  " if edit_mode else "rewrite"
+            print(f"{len(code.splitlines()):4d} lines  {label}  output {send_to_bot.last_usage['output_tokens']:5d} tokens   "
+                  f"{elapsed:6.2f} s")
+
+
+def bench_gutter(args):
+    """Per-keystroke cost of the line-number gutter on a 20k-line buffer (needs a display)"""
+    import statistics
+    import tkinter as tk
+    import gui
+
+    def full_rebuild(widget, gutter):
+        # what the gutter used to do on every key release
+        gutter.config(state='normal')
+        gutter.delete('1.0', tk.END)
+        num_lines = widget.text.get('1.0', tk.END).count('\n')
+        gutter.insert('1.0', '\n'.join(str(i) for i in range(1, num_lines)))
+        gutter.config(state='disabled')
+        gutter.yview_moveto(widget.text.yview()[0])
+
+    root = tk.Tk()
+    widget = gui.LineNumberedText(root)
+    widget.pack(fill=tk.BOTH, expand=True)
+    old_gutter = tk.Text(root, width=6)
+    widget.set_text("".join(f"value_{i} = {i} * 2\n" for i in range(20000)))
+    widget.text.mark_set('insert', '10000.0')
+    widget.text.see('insert')
+    root.update()
+
+    for label, redraw in (("full rebuild", lambda: full_rebuild(widget, old_gutter)),
+                          ("incremental", widget.update_line_numbers)):
+        timings = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            widget.text.insert('insert', 'x')
+            redraw()
+            root.update_idletasks()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{label:<13} median {statistics.median(timings):8.2f} ms   max {max(timings):8.2f} ms per keystroke")
+
+    # with debouncing a burst of keystrokes only redraws once
+    redraws = []
+    original = widget.update_line_numbers
+    widget.update_line_numbers = lambda event=None: (redraws.append(1), original())
+    for _ in range(args.requests):
+        widget.text.insert('insert', 'x')
+        widget.schedule_redraw()
+    time.sleep(gui.GUTTER_REDRAW_MS / 1000 * 2)
+    root.update()
+    print(f"debounced: {len(redraws)} redraw(s) for a burst of {args.requests} keystrokes")
+    root.destroy()
+
+
+def bench_pipeline(args):
+    """Wall time for back-to-back dictations, sequential vs the staged pipeline, against the mock LLM server"""
+    import audio_buffer
+    import send_to_bot
+    from pipeline import DictationPipeline, Utterance
+    from mock_llm_server import MockLLMServer
+
+    utterances, speak_s = 5, 2.0
+    model = None
+    if args.model:
+        import whisper
+        model = whisper.load_model(args.model)
+
+    def transcribe_stage(utterance):
+        if model is None:
+            time.sleep(1.0)  # stand-in for decoding when no --model is given
+            return " add a for loop"
+        return transcribe.transcribe_audio(utterance.recording, model)
+
+    def respond_stage(utterance):
+        return send_to_bot.send_text(utterance.transcript, "Claude", "mock-key", "Python", utterance.code)
+
+    send_to_bot.CACHE_ENABLED = False
+    with MockLLMServer(first_token_delay=1.0, chunk_delay=0.05) as server:
+        send_to_bot.CLAUDE_BASE_URL = server.url
+        recordings = []
+        for _ in range(utterances):
+            recording = audio_buffer.AudioBuffer()
+            for frame in synthetic_frames(speak_s):
+                recording.write(frame)
+            recordings.append(recording)
+
+        # sequential: the next utterance can only start once the previous result is back
+        start = time.perf_counter()
+        code = ""
+        for recording in recordings:
+            time.sleep(speak_s)
+            utterance = Utterance(recording, code)
+            utterance.transcript = transcribe_stage(utterance)
+            code = respond_stage(utterance)
+        sequential_s = time.perf_counter() - start
+
+        done = threading.Event()
+        results = []
+
+        def on_result(utterance):
+            results.append(utterance)
+            if len(results) == utterances:
+                done.set()
+
+        pipeline = DictationPipeline(transcribe_stage, respond_stage, on_result)
+        start = time.perf_counter()
+        for recording in recordings:
+            time.sleep(speak_s)
+            pipeline.submit(recording, "")
+        done.wait()
+        pipelined_s = time.perf_counter() - start
+        pipeline.close()
+
+    stats = pipeline.stats()
+    print(f"{utterances} utterances of {speak_s:.0f}s   sequential {sequential_s:6.2f} s   pipelined {pipelined_s:6.2f} s")
+    print(f"pipeline stages: queued {stats['queued_s']:.2f} s   ASR {stats['asr_s']:.2f} s   "
+          f"LLM {stats['llm_s']:.2f} s   capture to result {stats['total_s']:.2f} s")
+    print("results in order:", [utterance.id for utterance in results] == sorted(u.id for u in results))
+
+
+def bench_async(args):
+    """Concurrent requests and cancellation through the async backend, against the mock LLM server"""
+    import async_bot
+    import send_to_bot
+    from mock_llm_server import MockLLMServer
+
+    send_to_bot.CACHE_ENABLED = False
+    with MockLLMServer(first_token_delay=0.5, chunk_delay=0.05) as server:
+        send_to_bot.CLAUDE_BASE_URL = server.url
+        requests = min(args.requests, 10)
+
+        start = time.perf_counter()
+        for i in range(requests):
+            send_to_bot.send_text(f"write loop {i}", "Claude", "mock-key", "Python")
+        sequential_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        futures = [async_bot.submit(async_bot.send_text(f"write loop {i}", "Claude", "mock-key", "Python"))
+                   for i in range(requests)]
+        for future in futures:
+            future.result()
+        concurrent_s = time.perf_counter() - start
+        print(f"{requests} requests   sequential {sequential_s:6.2f} s   concurrent {concurrent_s:6.2f} s")
+
+        # a long generation, cancelled shortly after the first chunk
+        server.chunk_delay = 0.5
+        cancel_event = threading.Event()
+        chunks = []
+
+        def on_chunk(chunk):
+            chunks.append(time.perf_counter())
+            cancel_event.set()
+
+        try:
+            async_bot.run(async_bot.stream_text("write a loop", "Claude", "mock-key", "Python", on_chunk),
+                          cancel_event)
+        except async_bot.RequestCancelled:
+            pass
+        cancel_ms = (time.perf_counter() - chunks[0]) * 1000 if chunks else float("nan")
+        time.sleep(server.chunk_delay * 2)
+        print(f"cancelled stream returned {cancel_ms:6.1f} ms after the first chunk, "
+              f"server saw {server.aborted} aborted stream(s)")
+
+        timeout_start = time.perf_counter()
+        try:
+            async_bot.run(async_bot.stream_text("write a loop", "Claude", "mock-key", "Python", lambda chunk: None),
+                          timeout=1)
+        except TimeoutError as e:
+            print(f"{e} after {time.perf_counter() - timeout_start:.2f} s")
+
+
+def bench_race(args):
+    """Win rates and latency of racing Claude against Gemini, each behind its own mock server with jittered delays"""
+    import async_bot
+    import send_to_bot
+    from mock_llm_server import MockLLMServer
+
+    send_to_bot.CACHE_ENABLED = False
+    async_bot.RACE_LOG = os.devnull
+    keys = {"Claude": "mock-key", "Gemini": "mock-key"}
+    with MockLLMServer(first_token_delay=0.2, jitter=0.4) as claude_server, \
+            MockLLMServer(first_token_delay=0.3, jitter=0.2) as gemini_server:
+        send_to_bot.CLAUDE_BASE_URL = claude_server.url
+        send_to_bot.GEMINI_ENDPOINT = gemini_server.url
+        single = {provider: [] for provider in keys}
+        for i in range(args.requests):
+            for provider in keys:
+                start = time.perf_counter()
+                send_to_bot.send_text(f"write loop {i}", provider, keys[provider], "Python")
+                single[provider].append(time.perf_counter() - start)
+        raced = []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            send_to_bot.send_text(f"write loop {i}", async_bot.RACE, keys, "Python")
+            raced.append(time.perf_counter() - start)
+
+    for name, latencies in [*single.items(), ("Race", raced)]:
+        print(f"{name:<7} p50 {async_bot.percentile(latencies, 0.5) * 1000:7.1f} ms   "
+              f"p90 {async_bot.percentile(latencies, 0.9) * 1000:7.1f} ms")
+    for name, summary in async_bot.race_summary().items():
+        print(f"{name:<7} won {summary['win_rate']:.0%} of {summary['races']} races, {summary['errors']} errors")
+
+
+ROUTING_PROMPTS = [
+    " add a print statement",
+    " rename x to count",
+    " make the loop go to twenty",
+    " refactor this into a class with a method for each step",
+    " implement a parser for the config format and write tests for it",
+    " convert every function to use type hints and docstrings",
+]
+
+
+def bench_routing(args):
+    """Tier and max_tokens per prompt, then latency and tokens per tier with routing on and off (API part needs ANTHROPIC_API_KEY)"""
+    import router
+    import send_to_bot
+
+    code = "".join(f"def helper_{i}(values):\n    return [v * {i} for v in values]\n\n" for i in range(20))
+    for text in ROUTING_PROMPTS:
+        tier, max_tokens = router.classify(text, code)
+        print(f"{tier:<5}  max_tokens {max_tokens:5d}  {text.strip()}")
+
+    key = os.environ.get("ANTHROPIC_API_KEY")
+    if not key:
+        print("latency comparison needs ANTHROPIC_API_KEY")
+        return
+    send_to_bot.CACHE_ENABLED = False
+    for routing in (False, True):
+        send_to_bot.ROUTING_ENABLED = routing
+        for text in ROUTING_PROMPTS:
+            start = time.perf_counter()
+            send_to_bot.send_text(text, "Claude", key, "Python", code)
+            elapsed = time.perf_counter() - start
+            print(f"routing {'on ' if routing else 'off'}  {elapsed:6.2f} s  "
+                  f"output {send_to_bot.last_usage['output_tokens']:5d} tokens  {text.strip()}")
+    for tier, summary in router.summary().items():
+        print(f"{tier:<5}  {summary['requests']} requests  avg {summary['avg_latency_s']:.2f} s  "
+              f"avg output {summary['avg_output_tokens']:.0f} tokens  truncated {summary['truncated']}")
+
+
+def tick_lateness(work, interval=0.01):
+    """Run work on a thread and return the worst lateness of a 10 ms timer on this thread meanwhile, in ms"""
+    worker = threading.Thread(target=work)
+    worker.start()
+    worst = 0.0
+    while worker.is_alive():
+        expected = time.perf_counter() + interval
+        time.sleep(interval)
+        worst = max(worst, time.perf_counter() - expected)
+    worker.join()
+    return worst * 1000
+
+
+def bench_pool(args):
+    """Decode throughput and GUI-thread responsiveness, in-process model vs worker process pools"""
+    import whisper
+    import whisper_pool
+
+    model_name = args.model or "base"
+    clips = [transcribe.frames_to_float32(synthetic_frames(10)) for _ in range(max(4, os.cpu_count() or 1))]
+    audio_s = 10 * len(clips)
+
+    model = whisper.load_model(model_name)
+    start = time.perf_counter()
+    lateness = tick_lateness(lambda: [model.transcribe(clip) for clip in clips])
+    elapsed = time.perf_counter() - start
+    print(f"in-process           {audio_s / elapsed:6.1f}x realtime   worst UI tick delay {lateness:7.1f} ms")
+    del model
+
+    for workers in args.workers:
+        pool = whisper_pool.WhisperPool(model_name, workers)
+        pool.wait_ready()
+        start = time.perf_counter()
+        lateness = tick_lateness(lambda: [future.result() for future in [pool.submit(clip) for clip in clips]])
+        elapsed = time.perf_counter() - start
+        print(f"{workers} worker(s) x {pool.threads_per_worker:2d} thr {audio_s / elapsed:6.1f}x realtime   "
+              f"worst UI tick delay {lateness:7.1f} ms")
+        pool.close()
+
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance over the reference length, ignoring case and punctuation"""
+    normalize = lambda text: re.sub(r"[^\w\s']", " ", text.lower()).split()
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / max(1, len(reference))
+
+
+def reference_text(wav):
+    """The reference transcript stored next to a clip as <name>.txt, if there is one"""
+    path = os.path.splitext(wav)[0] + ".txt"
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    return None
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, nan where it cannot be read"""
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pass
+    try:
+        # Windows has no resource module, psutil reports the peak working set there
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2 ** 20
+    except (ImportError, AttributeError):
+        return float("nan")
+
+
+def run_engine(engine, model_name, clips, results, quantized=False):
+    """Child process for bench_engines and bench_quantize, so peak RSS covers one engine and model only"""
+    import asr_engines
+    import model_cache
+    start = time.perf_counter()
+    model = asr_engines.load_engine(engine, model_name, quantized=quantized)
+    load_s = time.perf_counter() - start
+    model_cache.warm_model(model)
+    start = time.perf_counter()
+    texts = [model.transcribe(clip, fp16=False)["text"] for clip in clips]
+    decode_s = time.perf_counter() - start
+    audio_s = sum(len(clip) for clip in clips) / transcribe.RATE
+    results.put({"load_s": load_s, "size_mb": model_cache.model_size_mb(model), "rss_mb": peak_rss_mb(),
+                 "rtf": decode_s / audio_s, "texts": texts})
+
+
+def engine_result(context, engine, model_name, clips, quantized=False, timeout=3600):
+    """
+    Run run_engine in a fresh process. Returns (result, exit code), with
+    result None if the process crashed or did not finish within timeout seconds
+    """
+    import queue
+    results = context.Queue()
+    process = context.Process(target=run_engine, args=(engine, model_name, clips, results, quantized))
+    process.start()
+    deadline = time.monotonic() + timeout
+    result = None
+    while result is None and time.monotonic() < deadline:
+        try:
+            result = results.get(timeout=1)
+        except queue.Empty:
+            if not process.is_alive():
+                # the result may still have been on its way when the process exited
+                try:
+                    result = results.get(timeout=1)
+                except queue.Empty:
+                    pass
+                break
+    if process.is_alive():
+        process.terminate()
+    process.join()
+    return result, process.exitcode
+
+
+def bench_engines(args):
+    """Real-time factor, peak RSS and WER of the ASR engines and model sizes on --wav clips (references in <clip>.txt)"""
+    import multiprocessing
+    if not args.wav:
+        print("engines benchmark needs --wav clips")
+        return
+    clips = [transcribe.frames_to_float32(transcribe.load_audio_frames(wav)) for wav in args.wav]
+    context = multiprocessing.get_context("spawn")
+    for model_name in args.models:
+        baseline = None
+        for engine in args.engines:
+            result, exit_code = engine_result(context, engine, model_name, clips)
+            if result is None:
+                print(f"{model_name:<7} {engine:<12} failed (exit code {exit_code})")
+                continue
+            # clips without a reference are scored against the PyTorch transcript
+            baseline = baseline or result["texts"]
+            references = [reference_text(wav) or base for wav, base in zip(args.wav, baseline)]
+            wer = sum(word_error_rate(ref, text) for ref, text in zip(references, result["texts"])) / len(references)
+            print(f"{model_name:<7} {engine:<12} load {result['load_s']:6.1f} s   RTF {result['rtf']:6.3f}   "
+                  f"peak RSS {result['rss_mb']:7.0f} MB   WER {wer:6.1%}")
+
+
+def bench_quantize(args):
+    """Load time, model size, peak RSS, RTF and WER of int8 vs fp32 PyTorch whisper models on the CPU"""
+    import multiprocessing
+    import asr_engines
+
+    if args.wav:
+        clips = [transcribe.frames_to_float32(transcribe.load_audio_frames(wav)) for wav in args.wav]
+    else:
+        clips = [transcribe.frames_to_float32(synthetic_frames(30))]
+    context = multiprocessing.get_context("spawn")
+    for model_name in args.models:
+        # the first int8 load quantizes and saves, the second reads the saved model
+        path = asr_engines.quantized_path(model_name)
+        if os.path.exists(path):
+            os.unlink(path)
+        baseline = None
+        for label, quantized in (("fp32", False), ("int8 first", True), ("int8 cached", True)):
+            result, exit_code = engine_result(context, "pytorch", model_name, clips, quantized)
+            if result is None:
+                print(f"{model_name:<7} {label:<11} failed (exit code {exit_code})")
+                continue
+            baseline = baseline or result["texts"]
+            references = [(args.wav and reference_text(wav)) or base for wav, base in zip(args.wav or [None], baseline)]
+            wer = sum(word_error_rate(ref, text) for ref, text in zip(references, result["texts"])) / len(references)
+            print(f"{model_name:<7} {label:<11} load {result['load_s']:6.1f} s   weights {result['size_mb']:6.0f} MB   "
+                  f"peak RSS {result['rss_mb']:6.0f} MB   RTF {result['rtf']:6.3f}   WER {wer:6.1%}")
+
+
+def bench_profiles(args):
+    """Decode latency and WER of each decode profile on --wav clips (references in <clip>.txt)"""
+    import statistics
+    import asr_engines
+    import model_cache
+    if not args.wav:
+        print("profiles benchmark needs --wav clips")
+        return
+    clips = [transcribe.frames_to_float32(transcribe.load_audio_frames(wav)) for wav in args.wav]
+    audio_s = sum(len(clip) for clip in clips) / transcribe.RATE
+    for model_name in args.models:
+        model = asr_engines.load_engine(args.engines[0], model_name)
+        model_cache.warm_model(model)
+        results = {}
+        for profile, options in asr_engines.DECODE_PROFILES.items():
+            latencies, texts = [], []
+            for clip in clips:
+                start = time.perf_counter()
+                texts.append(model.transcribe(clip, **options)["text"])
+                latencies.append(time.perf_counter() - start)
+            results[profile] = latencies, texts
+        # clips without a reference are scored against the accurate profile's transcript
+        baseline = results["accurate"][1]
+        references = [reference_text(wav) or base for wav, base in zip(args.wav, baseline)]
+        for profile, (latencies, texts) in results.items():
+            wer = sum(word_error_rate(ref, text) for ref, text in zip(references, texts)) / len(references)
+            print(f"{model_name:<7} {profile:<9} mean {statistics.mean(latencies):6.2f} s   "
+                  f"max {max(latencies):6.2f} s   RTF {sum(latencies) / audio_s:6.3f}   WER {wer:6.1%}")
+
+
+def bench_mel(args):
+    """Post-stop latency with the log-mel features computed after stop vs while recording"""
+    import statistics
+    import whisper
+    import asr_engines
+    import audio_buffer
+    import log_mel
+
+    model = whisper.load_model(args.model or "base", device="cpu")
+    options = dict(asr_engines.decode_options(asr_engines.DEFAULT_PROFILE), language="en", fp16=False)
+    source = [chunk for wav in args.wav for chunk in transcribe.load_audio_frames(wav)] if args.wav else None
+    for seconds in args.durations:
+        count = int(seconds * transcribe.RATE / transcribe.CHUNK)
+        frames = (source * (count // len(source) + 1))[:count] if source else synthetic_frames(seconds)
+        audio = transcribe.frames_to_float32(frames)
+
+        whisper_ms = time_call(lambda: whisper.log_mel_spectrogram(audio, model.dims.n_mels,
+                                                                   padding=whisper.audio.N_SAMPLES))
+        start = time.perf_counter()
+        batch_text = transcribe.transcribe_audio(frames, model, decode_options=options)
+        batch_s = time.perf_counter() - start
+
+        recording = audio_buffer.AudioBuffer()
+        transcriber = log_mel.MelTranscriber(model, recording, options)
+        chunk_ms = []
+        for data in frames:
+            recording.write(data)
+            start = time.perf_counter()
+            transcriber.notify()
+            chunk_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        mel_text = transcriber.finish()
+        mel_s = time.perf_counter() - start
+
+        print(f"{seconds:>5.0f}s  features after stop {whisper_ms:7.1f} ms   per chunk mean "
+              f"{statistics.mean(chunk_ms):.3f} ms max {max(chunk_ms):.3f} ms")
+        print(f"        post-stop  after-stop features {batch_s:6.2f} s   incremental {mel_s:6.2f} s   "
+              f"saved {batch_s - mel_s:6.2f} s   WER vs whisper {word_error_rate(batch_text, mel_text):6.1%}")
+
+
+FIRST_PAINT_SNIPPET = """
+import time
+start = time.perf_counter()
+import tkinter as tk
+import gui
+window = tk.Tk()
+app = gui.SpeechToCodeApp(window)
+window.update()
+print(time.perf_counter() - start, flush=True)
+window.destroy()
+"""
+
+
+def bench_startup(args):
+    """python -X importtime breakdown of gui.py and time to first paint of the window"""
+    import statistics
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import gui"],
+                            capture_output=True, text=True, cwd=here)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.split(":", 1)[1].split("|")]
+        imports.append((int(cumulative_us), int(self_us), name))
+    imports.sort(reverse=True)
+    import_ms = next((c / 1000 for c, _, name in imports if name == "gui"), 0.0)
+    print(f"import gui: {import_ms:.1f} ms, slowest imports (cumulative / self):")
+    for cumulative_us, self_us, name in imports[:15]:
+        print(f"  {cumulative_us / 1000:8.1f} ms {self_us / 1000:8.1f} ms  {name}")
+
+    paints = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", FIRST_PAINT_SNIPPET],
+                              capture_output=True, text=True, cwd=here)
+        if proc.returncode:
+            print(f"first paint run failed: {proc.stderr.strip().splitlines()[-1:]}")
+            return
+        paints.append((time.perf_counter() - start) * 1000)
+    paint_ms = statistics.median(paints)
+    print(f"time to first paint (process start to window drawn): median {paint_ms:.1f} ms "
+          f"over {args.repeat} runs")
+
+    if args.history:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                  text=True, cwd=here).stdout.strip()
+        with open(args.history, "a") as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')},{revision},{import_ms:.1f},{paint_ms:.1f}\n")
+        print(f"appended to {args.history}")
+
+
+def self_signed_cert(directory):
+    """Create a throwaway certificate for 127.0.0.1 with the openssl CLI"""
+    certfile = os.path.join(directory, "mock.pem")
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+        "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+        "-keyout", certfile, "-out", certfile
+    ], check=True, capture_output=True)
+    return certfile
+
+
+def bench_client_reuse(args):
+    """Per-request latency against a local HTTPS stub with and without client reuse"""
+    import statistics
+    import send_to_bot
+    from mock_llm_server import MockLLMServer
+
+    send_to_bot.CACHE_ENABLED = False
+    with tempfile.TemporaryDirectory() as directory:
+        certfile = self_signed_cert(directory)
+        # httpx picks this up when building its SSL context
+        os.environ["SSL_CERT_FILE"] = certfile
+        with MockLLMServer(first_token_delay=0, certfile=certfile) as server:
+            send_to_bot.CLAUDE_BASE_URL = server.url
+            for reuse in (False, True):
+                send_to_bot.clear_clients()
+                if reuse:
+                    send_to_bot.warm_up("Claude", "mock-key")
+                timings = []
+                for _ in range(args.requests):
+                    if not reuse:
+                        send_to_bot.clear_clients()
+                    start = time.perf_counter()
+                    send_to_bot.send_text("write a for loop", "Claude", "mock-key", "Python")
+                    timings.append((time.perf_counter() - start) * 1000)
+                label = "reused client" if reuse else "new client   "
+                print(f"{label} median {statistics.median(timings):7.2f} ms   "
+                      f"max {max(timings):7.2f} ms   over {args.requests} requests")
+            send_to_bot.clear_clients()
+
+
+BENCHMARKS = {
+    "in-memory": bench_in_memory,
+    "streaming": bench_streaming,
+    "llm-stream": bench_llm_stream,
+    "client-reuse": bench_client_reuse,
+    "vad": bench_vad,
+    "model-cache": bench_model_cache,
+    "startup": bench_startup,
+    "capture": bench_capture,
+    "sources": bench_sources,
+    "response-cache": bench_response_cache,
+    "prompt-cache": bench_prompt_cache,
+    "edit-mode": bench_edit_mode,
+    "gutter": bench_gutter,
+    "pipeline": bench_pipeline,
+    "async": bench_async,
+    "race": bench_race,
+    "routing": bench_routing,
+    "pool": bench_pool,
+    "engines": bench_engines,
+    "quantize": bench_quantize,
+    "profiles": bench_profiles,
+    "mel": bench_mel,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speech-to-Code benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--model", default=None, help="whisper model to load for end-to-end timings")
+    parser.add_argument("--wav", nargs="+", default=None, help="recorded dictations to replay")
+    parser.add_argument("--fast", action="store_true", help="replay audio without real-time pacing")
+    parser.add_argument("--requests", type=int, default=20, help="requests / keystrokes per run")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base"], help="whisper models to cycle through")
+    parser.add_argument("--cache-mb", type=int, default=4096, help="model cache memory budget")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per startup measurement")
+    parser.add_argument("--history", default=None, help="CSV file to append startup results to")
+    parser.add_argument("--capture-minutes", type=float, default=10, help="length of the simulated capture")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker process counts to try")
+    parser.add_argument("--engines", nargs="+", default=["pytorch", "ctranslate2", "onnx"],
+                        help="ASR engines to compare, pytorch first as the WER baseline; "
+                             "profiles uses the first one")
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 30, 120])
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
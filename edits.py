@@ -0,0 +1,68 @@
+import re
+
+EDIT_INSTRUCTIONS = """The user message starts with the current file. Do not repeat the file. \
+Reply only with search/replace blocks that make the requested change, in this exact format:
+<<<<<<< SEARCH
+lines copied exactly from the current file
+=======
+the lines that replace them
+>>>>>>> REPLACE
+Each SEARCH part must match the current file exactly, including indentation, and appear only once in it; \
+include a few surrounding lines if needed to make it unique. Use an empty SEARCH part to append to the end of the file."""
+
+BLOCK_PATTERN = re.compile(
+    r"^<{5,9} ?SEARCH[^\n]*\n(.*?)^={5,9}[^\n]*\n(.*?)^>{5,9} ?REPLACE[^\n]*$",
+    re.MULTILINE | re.DOTALL
+)
+
+
+class EditError(ValueError):
+    """A search/replace block that cannot be applied to the current code"""
+
+
+def edit_prompt(sys_prompt):
+    return sys_prompt + "\n" + EDIT_INSTRUCTIONS
+
+
+def parse_blocks(response):
+    """Search/replace pairs in a model response, empty if it has none"""
+    return [(search, replace) for search, replace in BLOCK_PATTERN.findall(response)]
+
+
+def apply_blocks(code, blocks):
+    """
+    Apply search/replace blocks to code.
+    Returns the new code and the changes as (start, end, replacement) offsets
+    into the original code, sorted by start. Raises EditError if a search
+    part is missing, ambiguous or overlaps another block.
+    """
+    changes = []
+    for search, replace in blocks:
+        if not search:
+            tail = "" if not code or code.endswith("\n") else "\n"
+            changes.append((len(code), len(code), tail + replace))
+            continue
+        start = code.find(search)
+        if start < 0 and search.endswith("\n") and code.endswith(search[:-1]):
+            # the editor text usually has no newline after its last line, which the block always does
+            changes.append((len(code) - len(search) + 1, len(code), replace.removesuffix("\n")))
+            continue
+        if start < 0:
+            raise EditError(f"search block not found in code: {search[:60]!r}")
+        if code.find(search, start + 1) >= 0:
+            raise EditError(f"search block matches more than once: {search[:60]!r}")
+        changes.append((start, start + len(search), replace))
+
+    changes.sort(key=lambda change: change[0])
+    for (_, end, _), (start, _, _) in zip(changes, changes[1:]):
+        if start < end:
+            raise EditError("search blocks overlap")
+
+    pieces = []
+    position = 0
+    for start, end, replace in changes:
+        pieces.append(code[position:start])
+        pieces.append(replace)
+        position = end
+    pieces.append(code[position:])
+    return "".join(pieces), changes
@@ -1,12 +1,27 @@
 import tkinter as tk
 from tkinter import scrolledtext, messagebox
-import transcribe
 import threading
-import whisper
+import difflib
 import json
 import os
+import time
+import autosave
+import asr_engines
+
+# transcribe, send_to_bot and model_cache pull in whisper/torch, pyaudio and the
+# LLM SDKs, so they are imported in the background once the window is up
 
 CONFIG_FILE = "config.json"
+BUFFER_FILE = "editor_buffer.txt"
+# Edits are picked up from the text area once typing pauses for this long
+TEXT_SAVE_DELAY_MS = 500
+# How often streamed LLM output is flushed into the text area
+STREAM_FLUSH_MS = 50
+# Delay before heavy modules start loading, so the first paint is not held up
+BACKGROUND_LOAD_DELAY_MS = 50
+
+# Gutter redraws are coalesced so bursts of keystrokes and scrolling draw once
+GUTTER_REDRAW_MS = 30
 
 class LineNumberedText(tk.Frame):
     def __init__(self, master, *args, **kwargs):
@@ -15,41 +30,92 @@ class LineNumberedText(tk.Frame):
         self.text = scrolledtext.ScrolledText(self, wrap=tk.WORD, width=60, height=20)
         self.text.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
         
-        self.line_numbers = tk.Text(self, width=4, padx=4, pady=4, takefocus=0,
-                                    border=0, background='lightgrey', state='disabled')
+        # a canvas only has to draw the numbers of the lines on screen
+        self.line_numbers = tk.Canvas(self, width=36, takefocus=0, highlightthickness=0,
+                                      border=0, background='lightgrey')
         self.line_numbers.pack(side=tk.LEFT, fill=tk.Y)
+        self.line_count = 1
+        self.redraw_pending = None
         
-        self.text.bind('<KeyRelease>', self.update_line_numbers)
-        self.text.bind('<MouseWheel>', self.update_line_numbers)
-        self.text.bind("<<Modified>>", self.update_line_numbers)
-        self.text.bind("<Configure>", self.update_line_numbers)
+        # every scroll and every change in the view goes through yscrollcommand
+        self.text.configure(yscrollcommand=self.on_scroll)
+        self.text.bind('<KeyRelease>', self.schedule_redraw, add='+')
+        self.text.bind("<<Modified>>", self.on_modified, add='+')
+        self.text.bind("<Configure>", self.schedule_redraw, add='+')
         
         self.update_line_numbers()
     
-    def update_line_numbers(self, event=None):
-        self.line_numbers.config(state='normal')
-        
-        self.line_numbers.delete('1.0', tk.END)
-        
-        num_lines = self.text.get('1.0', tk.END).count('\n')
-        
-        line_numbers_str = '\n'.join(str(i) for i in range(1, num_lines))
-        self.line_numbers.insert('1.0', line_numbers_str)
-        
-        self.line_numbers.config(state='disabled')
-        
-        if event is not None:
-            self.line_numbers.yview_moveto(self.text.yview()[0])
-        
+    def on_scroll(self, first, last):
+        self.text.vbar.set(first, last)
+        self.schedule_redraw()
+    
+    def on_modified(self, event=None):
+        self.schedule_redraw()
         self.text.edit_modified(False)
     
+    def schedule_redraw(self, event=None):
+        if self.redraw_pending is None:
+            self.redraw_pending = self.after(GUTTER_REDRAW_MS, self.update_line_numbers)
+    
+    def update_line_numbers(self, event=None):
+        """Redraw the numbers of the visible lines"""
+        if self.redraw_pending is not None:
+            self.after_cancel(self.redraw_pending)
+            self.redraw_pending = None
+        
+        self.line_count = int(self.text.index('end-1c').split('.')[0])
+        width = 8 + 8 * len(str(self.line_count))
+        if int(self.line_numbers['width']) != width:
+            self.line_numbers.config(width=width)
+        
+        self.line_numbers.delete('all')
+        font = self.text.cget('font')
+        line = int(self.text.index('@0,0').split('.')[0])
+        while line <= self.line_count:
+            info = self.text.dlineinfo(f'{line}.0')
+            if info is None:
+                # the start of this line is scrolled off, or we ran past the bottom
+                if line > int(self.text.index('@0,0').split('.')[0]):
+                    break
+            else:
+                self.line_numbers.create_text(width - 4, info[1], anchor='ne', text=str(line), font=font)
+            line += 1
+    
     def get_text(self):
         return self.text.get('1.0', 'end-1c')
     
     def set_text(self, text):
         self.text.delete('1.0', tk.END)
         self.text.insert('1.0', text)
-        self.update_line_numbers()
+        self.schedule_redraw()
+    
+    def update_text(self, text):
+        """Replace the content, only touching the lines that changed"""
+        old_lines = self.get_text().split('\n')
+        new_lines = text.split('\n')
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        # apply from the bottom up so line numbers above each change stay valid
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == 'equal':
+                continue
+            replacement = '\n'.join(new_lines[j1:j2])
+            if i2 < len(old_lines):
+                self.text.delete(f'{i1 + 1}.0', f'{i2 + 1}.0')
+                if j2 > j1:
+                    self.text.insert(f'{i1 + 1}.0', replacement + '\n')
+            elif i1 == i2:
+                self.text.insert('end-1c', '\n' + replacement)
+            elif j2 > j1:
+                self.text.delete(f'{i1 + 1}.0', 'end-1c')
+                self.text.insert(f'{i1 + 1}.0', replacement)
+            else:
+                self.text.delete(f'{i1}.end', 'end-1c')
+        self.schedule_redraw()
+    
+    def append_text(self, text):
+        self.text.insert('end-1c', text)
+        self.text.see(tk.END)
+        self.schedule_redraw()
 
 class SpeechToCodeApp:
     def __init__(self, root):
@@ -60,31 +126,133 @@ class SpeechToCodeApp:
         self.selected_option = tk.StringVar()
         self.selected_option.set("Claude")
         self.model = self.selected_option.get()
-        self.options = ["Claude", "Gemma"]
+        self.options = ["Claude", "Gemini", "Race"]
         self.api_key = ""
+        # keys per provider, Race sends to every provider that has one
+        self.provider_keys = {}
         self.language = ""
         
         self.transcription_text = ""
         
+        self.stream_response = tk.BooleanVar()
+        self.stream_response.set(False)
+        self.cache_responses = tk.BooleanVar()
+        self.cache_responses.set(True)
+        self.edit_mode = tk.BooleanVar()
+        self.edit_mode.set(False)
+        self.route_models = tk.BooleanVar()
+        self.route_models.set(False)
+        self.pipeline_mode = tk.BooleanVar()
+        self.pipeline_mode.set(False)
+        self.pipeline = None
+        self.chunk_lock = threading.Lock()
+        self.pending_chunks = []
+        self.flush_scheduled = False
+        self.streamed_text = ""
+        
         self.is_recording = False
         self.transcription_thread = None
         self.stop_event = threading.Event()
+        # set by the Stop button once recording is over, to abort the LLM request
+        self.cancel_event = threading.Event()
+        self.request_timeout = tk.IntVar()
+        self.request_timeout.set(60)
         
         self.whisper_model = None
+        self.whisper_model_loaded = None
         self.whisper_model_name = tk.StringVar()
         self.whisper_model_name.set("turbo")
         self.whisper_model_options = ["tiny", "base", "small", "medium", "large", "turbo"]
+        self.asr_engine = tk.StringVar()
+        self.asr_engine.set(asr_engines.DEFAULT_ENGINE)
+        # dynamic int8 quantization of the PyTorch models, cached on disk
+        self.quantize_whisper = tk.BooleanVar()
+        self.quantize_whisper.set(False)
+        self.decode_profile = tk.StringVar()
+        self.decode_profile.set(asr_engines.DEFAULT_PROFILE)
+        # the language being spoken, separate from the programming language
+        self.spoken_language = tk.StringVar()
+        self.spoken_language.set("auto")
+        self.stream_transcription = tk.BooleanVar()
+        self.stream_transcription.set(False)
+        # compute whisper's features while recording (PyTorch models)
+        self.incremental_mel = tk.BooleanVar()
+        self.incremental_mel.set(False)
+        self.model_cache_mb = 4096
+        # decode in this many worker processes, 0 decodes in the GUI process
+        self.whisper_workers = tk.IntVar()
+        self.whisper_workers.set(0)
+        self.whisper_pool = None
+        self.remove_silence = tk.BooleanVar()
+        self.remove_silence.set(False)
+        self.auto_stop_seconds = tk.IntVar()
+        self.auto_stop_seconds.set(0)
         
         self.load_config()
+        self.model_cache = None
+        self.model_cache_engine = None
+        self.model_cache_lock = threading.Lock()
         
         self.create_control_panel()
+        self.autosaver = autosave.Autosaver(on_error=self.on_save_error)
+        self.text_save_pending = None
+        
         self.create_text_area()
+        self.restore_buffer()
         
-        self.text_area.text.bind('<<Modified>>', self.on_text_change)
+        self.text_area.text.bind('<<Modified>>', self.on_text_change, add='+')
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
         
+        self.window.after(BACKGROUND_LOAD_DELAY_MS, self.start_background_loading)
+    
+    def start_background_loading(self):
+        """Load the whisper model and import the pipeline modules off the Tk thread"""
         self.load_model_thread = threading.Thread(target=self.load_whisper_model)
         self.load_model_thread.daemon = True
         self.load_model_thread.start()
+        
+        threading.Thread(target=self.preload_modules, daemon=True).start()
+        self.warm_llm_client()
+    
+    def preload_modules(self):
+        try:
+            import transcribe
+        except Exception as e:
+            print(f"Error loading transcription modules: {e}")
+    
+    def get_model_cache(self):
+        engine = (self.asr_engine.get(), self.quantize_whisper.get())
+        with self.model_cache_lock:
+            if self.model_cache is not None and self.model_cache_engine != engine:
+                # models of another engine are not reused, so free their memory
+                self.model_cache.clear()
+                self.model_cache = None
+            if self.model_cache is None:
+                import model_cache
+                self.model_cache = model_cache.WhisperModelCache(
+                    self.model_cache_mb,
+                    loader=lambda name: asr_engines.load_engine(engine[0], name, quantized=engine[1]))
+                self.model_cache_engine = engine
+            return self.model_cache
+    
+    def warm_llm_client(self):
+        """Open the LLM connection in the background so the first dictation skips the handshake"""
+        keys = self.provider_keys.items() if self.model == "Race" else [(self.model, self.api_key)]
+        for model, api_key in keys:
+            if api_key:
+                threading.Thread(target=self.warm_up_client, args=(model, api_key),
+                                 daemon=True).start()
+    
+    def request_key(self):
+        """The key argument for send_text: one key, or all provider keys when racing"""
+        return self.provider_keys if self.model == "Race" else self.api_key
+    
+    def warm_up_client(self, model, api_key):
+        import send_to_bot
+        import async_bot
+        # requests with a cancel button or a timeout go through async_bot's own clients
+        async_bot.run(async_bot.warm_up(model, api_key))
+        send_to_bot.warm_up(model, api_key)
     
     def load_config(self):
         """Load configuration from file if it exists"""
@@ -97,8 +265,9 @@ class SpeechToCodeApp:
                     self.api_key = config['api_key']
                 
                 if 'model' in config:
-                    self.selected_option.set(config['model'])
-                    self.model = config['model']
+                    # the Gemini option used to be called Gemma
+                    self.model = "Gemini" if config['model'] == "Gemma" else config['model']
+                    self.selected_option.set(self.model)
                 
                 if 'language' in config:
                     self.language = config['language']
@@ -106,6 +275,59 @@ class SpeechToCodeApp:
                 if 'whisper_model' in config:
                     self.whisper_model_name.set(config['whisper_model'])
                 
+                if 'stream_transcription' in config:
+                    self.stream_transcription.set(config['stream_transcription'])
+                
+                if 'stream_response' in config:
+                    self.stream_response.set(config['stream_response'])
+                
+                if 'cache_responses' in config:
+                    self.cache_responses.set(config['cache_responses'])
+                
+                if 'edit_mode' in config:
+                    self.edit_mode.set(config['edit_mode'])
+                
+                if 'route_models' in config:
+                    self.route_models.set(config['route_models'])
+                
+                if 'pipeline_mode' in config:
+                    self.pipeline_mode.set(config['pipeline_mode'])
+                
+                if 'remove_silence' in config:
+                    self.remove_silence.set(config['remove_silence'])
+                
+                if 'auto_stop_seconds' in config:
+                    self.auto_stop_seconds.set(config['auto_stop_seconds'])
+                
+                if 'request_timeout' in config:
+                    self.request_timeout.set(config['request_timeout'])
+                
+                if 'provider_keys' in config:
+                    self.provider_keys = config['provider_keys']
+                if self.api_key and self.model != "Race":
+                    self.provider_keys.setdefault(self.model, self.api_key)
+                
+                if 'asr_engine' in config:
+                    self.asr_engine.set(config['asr_engine'])
+                
+                if 'quantize_whisper' in config:
+                    self.quantize_whisper.set(config['quantize_whisper'])
+                
+                if 'decode_profile' in config:
+                    self.decode_profile.set(config['decode_profile'])
+                
+                if 'spoken_language' in config:
+                    self.spoken_language.set(config['spoken_language'])
+                
+                if 'incremental_mel' in config:
+                    self.incremental_mel.set(config['incremental_mel'])
+                
+                if 'whisper_workers' in config:
+                    self.whisper_workers.set(config['whisper_workers'])
+                
+                if 'model_cache_mb' in config:
+                    self.model_cache_mb = config['model_cache_mb']
+                
                 print("Configuration loaded successfully")
             except Exception as e:
                 print(f"Error loading configuration: {e}")
@@ -114,47 +336,114 @@ class SpeechToCodeApp:
         """Save current configuration to file"""
         config = {
             'api_key': self.api_key,
+            'provider_keys': self.provider_keys,
             'model': self.model,
             'language': self.language,
-            'whisper_model': self.whisper_model_name.get()
+            'whisper_model': self.whisper_model_name.get(),
+            'stream_transcription': self.stream_transcription.get(),
+            'stream_response': self.stream_response.get(),
+            'cache_responses': self.cache_responses.get(),
+            'edit_mode': self.edit_mode.get(),
+            'route_models': self.route_models.get(),
+            'pipeline_mode': self.pipeline_mode.get(),
+            'remove_silence': self.remove_silence.get(),
+            'auto_stop_seconds': self.auto_stop_seconds.get(),
+            'request_timeout': self.request_timeout.get(),
+            'asr_engine': self.asr_engine.get(),
+            'quantize_whisper': self.quantize_whisper.get(),
+            'decode_profile': self.decode_profile.get(),
+            'spoken_language': self.spoken_language.get(),
+            'incremental_mel': self.incremental_mel.get(),
+            'whisper_workers': self.whisper_workers.get(),
+            'model_cache_mb': self.model_cache_mb
         }
         
-        try:
-            with open(CONFIG_FILE, 'w') as f:
-                json.dump(config, f)
-            
-            self.status_label.config(text="Settings saved", fg="blue")
-            self.window.after(1000, lambda: self.status_label.config(
-                text="Not Recording" if not self.is_recording else "Recording...",
-                fg="red" if not self.is_recording else "green"
-            ))
-            
-        except Exception as e:
-            print(f"Error saving configuration: {e}")
-            messagebox.showerror("Save Error", f"Could not save settings: {e}")
-    
-    def on_text_change(self, event=None):
-        """Automatically save text content whenever it changes"""
-        self.transcription_text = self.text_area.get_text()
-        self.text_area.text.edit_modified(False)
+        # written on the autosave thread
+        self.autosaver.save(CONFIG_FILE, json.dumps(config))
         
-        self.status_label.config(text="Text Auto-Saved", fg="blue")
+        self.status_label.config(text="Settings saved", fg="blue")
         self.window.after(1000, lambda: self.status_label.config(
             text="Not Recording" if not self.is_recording else "Recording...",
             fg="red" if not self.is_recording else "green"
         ))
     
+    def on_save_error(self, path, error):
+        """Called from the autosave thread when a write fails"""
+        if path == CONFIG_FILE:
+            self.window.after(0, lambda: messagebox.showerror(
+                "Save Error", f"Could not save settings: {error}"))
+    
+    def restore_buffer(self):
+        """Reload the editor content saved by the last session"""
+        if os.path.exists(BUFFER_FILE):
+            try:
+                with open(BUFFER_FILE, 'r', encoding='utf-8') as f:
+                    self.transcription_text = f.read()
+                self.text_area.set_text(self.transcription_text)
+            except Exception as e:
+                print(f"Error restoring editor buffer: {e}")
+    
+    def on_text_change(self, event=None):
+        """Pick up the text once edits pause, then save it in the background"""
+        if self.text_save_pending is not None:
+            self.window.after_cancel(self.text_save_pending)
+        self.text_save_pending = self.window.after(TEXT_SAVE_DELAY_MS, self.save_text)
+    
+    def save_text(self):
+        self.text_save_pending = None
+        text = self.text_area.get_text()
+        if text == self.transcription_text:
+            return
+        self.transcription_text = text
+        self.autosaver.save(BUFFER_FILE, text)
+        self.autosaver.snapshot(text)
+        
+        if not self.is_recording:
+            self.status_label.config(text="Text Auto-Saved", fg="blue")
+            self.window.after(1000, lambda: self.status_label.config(
+                text="Not Recording" if not self.is_recording else "Recording...",
+                fg="red" if not self.is_recording else "green"
+            ))
+    
+    def on_close(self):
+        if self.text_save_pending is not None:
+            self.window.after_cancel(self.text_save_pending)
+            self.save_text()
+        self.autosaver.close()
+        if self.whisper_pool is not None:
+            self.whisper_pool.close()
+        self.window.destroy()
+    
     def load_whisper_model(self):
         """Load the whisper model in a background thread"""
         try:
             model_name = self.whisper_model_name.get()
             self.window.after(0, lambda: self.status_label.config(
                 text=f"Loading {model_name} model...", fg="blue"))
+            if self.whisper_workers.get() > 0:
+                self.load_whisper_pool(model_name)
+                return
+            if self.whisper_pool is not None:
+                self.whisper_model = None
+                self.whisper_pool.close()
+                self.whisper_pool = None
+            if self.model_cache is not None and \
+                    self.model_cache_engine != (self.asr_engine.get(), self.quantize_whisper.get()):
+                self.whisper_model = None
+            cache = self.get_model_cache()
+            
+            # let go of the current model if the cache is about to drop it
+            if self.whisper_model is not None and \
+                    self.whisper_model_loaded in cache.will_evict(model_name):
+                self.whisper_model = None
             
-            self.whisper_model = whisper.load_model(model_name)
+            self.whisper_model = cache.get(model_name)
+            self.whisper_model_loaded = model_name
+            timings = cache.timings[model_name]
             
             self.window.after(0, lambda: self.status_label.config(
-                text=f"{model_name} model loaded successfully", fg="green"))
+                text=f"{model_name} model ready (load {timings['load_s']:.1f}s, "
+                     f"warm-up {timings['warm_s']:.1f}s)", fg="green"))
             
             self.window.after(3000, lambda: self.status_label.config(
                 text="Not Recording", fg="red"))
@@ -166,6 +455,37 @@ class SpeechToCodeApp:
             self.window.after(0, lambda: self.status_label.config(
                 text="Model load failed", fg="red"))
     
+    def load_whisper_pool(self, model_name):
+        """Start worker processes that each load the model, keeping decoding off the GUI process"""
+        import whisper_pool
+        old_pool = self.whisper_pool
+        self.whisper_model = None
+        if old_pool is not None:
+            old_pool.close()
+        # the workers hold their own models, don't keep in-process ones next to them
+        with self.model_cache_lock:
+            if self.model_cache is not None:
+                self.model_cache.clear()
+                self.model_cache = None
+        start = time.perf_counter()
+        pool = whisper_pool.WhisperPool(model_name, self.whisper_workers.get(), engine=self.asr_engine.get(),
+                                        quantized=self.quantize_whisper.get())
+        try:
+            pool.wait_ready()
+        except Exception:
+            pool.close()
+            self.whisper_pool = None
+            raise
+        self.whisper_pool = self.whisper_model = pool
+        self.whisper_model_loaded = model_name
+        elapsed = time.perf_counter() - start
+        
+        self.window.after(0, lambda: self.status_label.config(
+            text=f"{model_name} ready in {pool.workers} worker(s) x {pool.threads_per_worker} "
+                 f"thread(s) ({elapsed:.1f}s)", fg="green"))
+        self.window.after(3000, lambda: self.status_label.config(
+            text="Not Recording", fg="red"))
+    
     def change_whisper_model(self):
         """Change the whisper model"""
         if self.is_recording:
@@ -177,6 +497,17 @@ class SpeechToCodeApp:
         self.load_model_thread.start()
         self.save_config()
         
+    def change_spoken_language(self):
+        # switching back to auto detects the language again
+        asr_engines.detected_language = None
+        self.save_config()
+        
+    def whisper_options(self):
+        """transcribe options for the selected decode profile and spoken language"""
+        options = asr_engines.decode_options(self.decode_profile.get())
+        options.update(asr_engines.language_options(self.spoken_language.get()))
+        return options
+        
     def create_control_panel(self):
         control_frame = tk.Frame(self.window)
         control_frame.pack(fill=tk.X, padx=10, pady=10)
@@ -192,6 +523,21 @@ class SpeechToCodeApp:
         button.pack(side=tk.LEFT, padx=5)
         self.model_label = tk.Label(model_frame, text=f"Selected: {self.model}" if self.model else "")
         self.model_label.pack(side=tk.LEFT, padx=10)
+        stream_response_check = tk.Checkbutton(model_frame, text="Stream response",
+                                               variable=self.stream_response, command=self.save_config)
+        stream_response_check.pack(side=tk.LEFT, padx=5)
+        cache_check = tk.Checkbutton(model_frame, text="Cache responses",
+                                     variable=self.cache_responses, command=self.save_config)
+        cache_check.pack(side=tk.LEFT, padx=5)
+        edit_check = tk.Checkbutton(model_frame, text="Edit mode",
+                                    variable=self.edit_mode, command=self.save_config)
+        edit_check.pack(side=tk.LEFT, padx=5)
+        route_check = tk.Checkbutton(model_frame, text="Route by complexity",
+                                     variable=self.route_models, command=self.save_config)
+        route_check.pack(side=tk.LEFT, padx=5)
+        pipeline_check = tk.Checkbutton(model_frame, text="Pipeline mode",
+                                        variable=self.pipeline_mode, command=self.save_config)
+        pipeline_check.pack(side=tk.LEFT, padx=5)
         
         whisper_frame = tk.Frame(control_frame)
         whisper_frame.pack(fill=tk.X, pady=5)
@@ -200,8 +546,47 @@ class SpeechToCodeApp:
         whisper_dropdown = tk.OptionMenu(whisper_frame, self.whisper_model_name, 
                                         *self.whisper_model_options)
         whisper_dropdown.pack(side=tk.LEFT, padx=5)
+        engine_dropdown = tk.OptionMenu(whisper_frame, self.asr_engine, *asr_engines.ENGINES,
+                                        command=lambda _: self.save_config())
+        engine_dropdown.pack(side=tk.LEFT, padx=5)
+        quantize_check = tk.Checkbutton(whisper_frame, text="int8 (PyTorch)",
+                                        variable=self.quantize_whisper, command=self.save_config)
+        quantize_check.pack(side=tk.LEFT, padx=5)
+        tk.Label(whisper_frame, text="Decode:").pack(side=tk.LEFT)
+        profile_dropdown = tk.OptionMenu(whisper_frame, self.decode_profile, *asr_engines.DECODE_PROFILES,
+                                         command=lambda _: self.save_config())
+        profile_dropdown.pack(side=tk.LEFT, padx=5)
+        tk.Label(whisper_frame, text="Speech:").pack(side=tk.LEFT)
+        spoken_dropdown = tk.OptionMenu(whisper_frame, self.spoken_language, *asr_engines.SPOKEN_LANGUAGES,
+                                        command=lambda _: self.change_spoken_language())
+        spoken_dropdown.pack(side=tk.LEFT, padx=5)
         whisper_button = tk.Button(whisper_frame, text="Load Model", command=self.change_whisper_model)
         whisper_button.pack(side=tk.LEFT, padx=5)
+        stream_check = tk.Checkbutton(whisper_frame, text="Transcribe while recording",
+                                      variable=self.stream_transcription, command=self.save_config)
+        stream_check.pack(side=tk.LEFT, padx=5)
+        mel_check = tk.Checkbutton(whisper_frame, text="Features while recording",
+                                   variable=self.incremental_mel, command=self.save_config)
+        mel_check.pack(side=tk.LEFT, padx=5)
+        tk.Label(whisper_frame, text="Worker processes (0 = off):").pack(side=tk.LEFT, padx=5)
+        workers_box = tk.Spinbox(whisper_frame, from_=0, to=8, width=3,
+                                 textvariable=self.whisper_workers, command=self.save_config)
+        workers_box.pack(side=tk.LEFT)
+        
+        audio_frame = tk.Frame(control_frame)
+        audio_frame.pack(fill=tk.X, pady=5)
+        
+        silence_check = tk.Checkbutton(audio_frame, text="Trim silence",
+                                       variable=self.remove_silence, command=self.save_config)
+        silence_check.pack(side=tk.LEFT)
+        tk.Label(audio_frame, text="Auto-stop after silence (s, 0 = off):").pack(side=tk.LEFT, padx=5)
+        auto_stop_box = tk.Spinbox(audio_frame, from_=0, to=10, width=4,
+                                   textvariable=self.auto_stop_seconds, command=self.save_config)
+        auto_stop_box.pack(side=tk.LEFT)
+        tk.Label(audio_frame, text="LLM timeout (s, 0 = none):").pack(side=tk.LEFT, padx=5)
+        timeout_box = tk.Spinbox(audio_frame, from_=0, to=600, increment=10, width=4,
+                                 textvariable=self.request_timeout, command=self.save_config)
+        timeout_box.pack(side=tk.LEFT)
         
         key_frame = tk.Frame(control_frame)
         key_frame.pack(fill=tk.X, pady=5)
@@ -259,7 +644,12 @@ class SpeechToCodeApp:
     
     def option_changed(self, event):
         self.model = self.selected_option.get()
+        if self.model in self.provider_keys:
+            self.api_key = self.provider_keys[self.model]
+            self.key_textbox.delete(0, tk.END)
+            self.key_textbox.insert(0, self.api_key)
         self.save_config()
+        self.warm_llm_client()
     
     def show_model(self):
         self.model_label.config(text=f"Selected: {self.model}")
@@ -267,8 +657,11 @@ class SpeechToCodeApp:
     
     def save_key(self):
         self.api_key = self.key_textbox.get()
+        if self.model != "Race":
+            self.provider_keys[self.model] = self.api_key
         self.key_label.config(text=f"API Key saved")
         self.save_config()
+        self.warm_llm_client()
     
     def save_language(self):
         self.language = self.lang_textbox.get()
@@ -280,46 +673,196 @@ class SpeechToCodeApp:
             messagebox.showwarning("Warning", "Whisper model is not loaded yet")
             return
         
+        # make sure the recording starts from the latest editor content
+        if self.text_save_pending is not None:
+            self.window.after_cancel(self.text_save_pending)
+            self.save_text()
+        
         self.is_recording = True
         
         self.record_button.config(state=tk.DISABLED)
-        self.stop_button.config(state=tk.NORMAL)
+        self.stop_button.config(state=tk.NORMAL, text="Stop Recording")
         self.status_label.config(text="Recording...", fg="green")
         
         self.stop_event.clear()
+        self.cancel_event.clear()
         
         self.transcription_thread = threading.Thread(
-            target=self.run_transcription,
+            target=self.run_capture if self.pipeline_mode.get() else self.run_transcription,
             daemon=True
         )
         self.transcription_thread.start()
     
     def stop_recording(self):
-        self.is_recording = False
+        if not (self.transcription_thread and self.transcription_thread.is_alive()):
+            self.is_recording = False
+            return
         
-        if self.transcription_thread and self.transcription_thread.is_alive():
-            self.stop_event.set()
-            
-            self.record_button.config(state=tk.NORMAL)
+        if not self.is_recording:
+            # second press: the recording is over, abort the LLM request
+            self.cancel_event.set()
+            self.stop_button.config(state=tk.DISABLED)
+            self.status_label.config(text="Cancelling...", fg="red")
+            return
+        
+        self.is_recording = False
+        self.stop_event.set()
+        if self.pipeline_mode.get():
             self.stop_button.config(state=tk.DISABLED)
             self.status_label.config(text="Not Recording", fg="red")
+        else:
+            self.stop_button.config(text="Cancel Request")
+            self.status_label.config(text="Waiting for response...", fg="blue")
+    
+    def queue_chunk(self, chunk):
+        """Collect streamed response text, the Tk thread applies it in batches"""
+        with self.chunk_lock:
+            self.pending_chunks.append(chunk)
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.window.after(STREAM_FLUSH_MS, self.flush_chunks)
+    
+    def flush_chunks(self):
+        with self.chunk_lock:
+            text = "".join(self.pending_chunks)
+            self.pending_chunks = []
+            self.flush_scheduled = False
+        if not text:
+            return
+        if not self.streamed_text:
+            self.text_area.set_text("")
+        self.streamed_text += text
+        self.text_area.append_text(text)
+    
+    def show_result(self, result):
+        self.flush_chunks()
+        if self.streamed_text != result:
+            self.text_area.update_text(result)
     
     def run_transcription(self):
-        result = transcribe.record_and_transcribe(
-            self.transcription_text, self.api_key, self.model, 
-            self.language, self.stop_event, self.whisper_model
-        )
+        import transcribe
+        import send_to_bot
+        import async_bot
+        send_to_bot.CACHE_ENABLED = self.cache_responses.get()
+        send_to_bot.ROUTING_ENABLED = self.route_models.get()
+        self.streamed_text = ""
+        code = self.transcription_text
+        error = None
+        try:
+            result = transcribe.record_and_transcribe(
+                code, self.request_key(), self.model, 
+                self.language, self.stop_event, self.whisper_model,
+                self.stream_transcription.get(),
+                self.queue_chunk if self.stream_response.get() else None,
+                self.remove_silence.get(), self.auto_stop_seconds.get(),
+                edit_mode=self.edit_mode.get(), cancel_event=self.cancel_event,
+                timeout=self.request_timeout.get(),
+                decode_options=self.whisper_options(),
+                incremental_mel=self.incremental_mel.get()
+            )
+        except async_bot.RequestCancelled:
+            result, error = code, "Request cancelled"
+        except TimeoutError as e:
+            result, error = code, f"Request timed out: {e}"
+        except Exception as e:
+            # e.g. a race without two provider keys, or one where every provider failed;
+            # the buttons below still have to be restored
+            result, error = code, f"Request failed: {e}"
         
-        if not result:
+        # a cancelled or failed request puts back the code it started from, even when that is empty
+        if not result and not error:
             result = "No transcription result received."
         
-        self.window.after(0, lambda: self.text_area.set_text(result))
+        self.window.after(0, lambda: self.show_result(result))
         
         
         self.window.after(0, lambda: self.record_button.config(state=tk.NORMAL))
-        self.window.after(0, lambda: self.stop_button.config(state=tk.DISABLED))
-        self.window.after(0, lambda: self.status_label.config(text="Not Recording", fg="red"))
+        self.window.after(0, lambda: self.stop_button.config(state=tk.DISABLED, text="Stop Recording"))
+        if error:
+            print(error)
+            self.window.after(0, lambda: self.status_label.config(text=error, fg="red"))
+        elif send_to_bot.last_cache_hit:
+            hit_rate = send_to_bot.get_response_cache().stats()['hit_rate']
+            self.window.after(0, lambda: self.status_label.config(
+                text=f"Cached response ({hit_rate:.0%} hit rate)", fg="blue"))
+            self.window.after(3000, lambda: self.status_label.config(
+                text="Not Recording" if not self.is_recording else "Recording...",
+                fg="red" if not self.is_recording else "green"))
+        else:
+            self.window.after(0, lambda: self.status_label.config(text="Not Recording", fg="red"))
         self.is_recording = False
+    
+    def get_pipeline(self):
+        if self.pipeline is None:
+            import pipeline
+            self.pipeline = pipeline.DictationPipeline(
+                self.pipeline_transcribe, self.pipeline_respond,
+                lambda utterance: self.window.after(0, lambda: self.show_pipeline_result(utterance)))
+        return self.pipeline
+    
+    def pipeline_transcribe(self, utterance):
+        import transcribe
+        text = transcribe.transcribe_recording(utterance.recording, self.whisper_model,
+                                               utterance.streamer, self.remove_silence.get(),
+                                               self.whisper_options())
+        if text is None:
+            # the error keeps the utterance away from the LLM
+            raise RuntimeError(transcribe.NO_SPEECH)
+        return text
+    
+    def pipeline_respond(self, utterance):
+        import transcribe
+        import send_to_bot
+        send_to_bot.CACHE_ENABLED = self.cache_responses.get()
+        send_to_bot.ROUTING_ENABLED = self.route_models.get()
+        print(f"Transcription: {utterance.code + utterance.transcript}")
+        return transcribe.respond(utterance.transcript, utterance.code, self.request_key(), self.model,
+                                  self.language, edit_mode=self.edit_mode.get(),
+                                  timeout=self.request_timeout.get())
+    
+    def run_capture(self):
+        """Record one utterance and hand it to the pipeline, so the next one can be recorded right away"""
+        import transcribe
+        recording, streamer = transcribe.record_audio(
+            self.stop_event, self.whisper_model, self.stream_transcription.get(),
+            self.auto_stop_seconds.get(),
+            decode_options=self.whisper_options(),
+            incremental_mel=self.incremental_mel.get() and not self.remove_silence.get()
+        )
+        self.is_recording = False
+        self.window.after(0, lambda: self.record_button.config(state=tk.NORMAL))
+        self.window.after(0, lambda: self.stop_button.config(state=tk.DISABLED))
+        
+        if recording is None or not recording:
+            if streamer:
+                streamer.stopping.set()
+            message = "Failed to initialize audio" if recording is None else "No audio was recorded"
+            self.window.after(0, lambda: self.status_label.config(text=message, fg="red"))
+            return
+        
+        # blocks while the pipeline is full, which keeps the backlog bounded
+        self.get_pipeline().submit(recording, self.transcription_text, streamer)
+        self.window.after(0, self.show_pipeline_status)
+    
+    def show_pipeline_status(self):
+        if self.is_recording:
+            return
+        stats = self.get_pipeline().stats()
+        self.status_label.config(
+            text=f"{stats['in_flight']} in flight, queued ASR {stats['asr_queue']} LLM {stats['llm_queue']} | "
+                 f"ASR {stats['asr_s']:.1f}s, LLM {stats['llm_s']:.1f}s, total {stats['total_s']:.1f}s",
+            fg="blue" if stats['in_flight'] else "red")
+    
+    def show_pipeline_result(self, utterance):
+        """Results arrive in recording order on the Tk thread"""
+        if utterance.error:
+            print(utterance.error)
+            messagebox.showerror("Pipeline Error", utterance.error)
+        else:
+            self.streamed_text = ""
+            self.show_result(utterance.response)
+        self.show_pipeline_status()
 
 if __name__ == "__main__":
     window = tk.Tk()
@@ -0,0 +1,204 @@
+import threading
+import numpy as np
+import asr_engines
+
+# whisper's feature parameters: 25 ms windows every 10 ms over 16 kHz audio, 30 s per decoding window
+N_FFT = 400
+HOP_LENGTH = 160
+N_FRAMES = 3000
+# log10 of the power floor, the value of frames of pure silence
+SILENCE = -10.0
+
+
+class IncrementalLogMel:
+    """
+    whisper's log-mel spectrogram, computed chunk by chunk as audio arrives.
+
+    Every frame whose 400 sample window is complete is computed straight away
+    with one vectorized FFT per chunk and written into a preallocated buffer
+    that is padded with silence to whole 30 s windows, so finish() only has
+    the last few frames and the normalization left to do. The result matches
+    whisper.log_mel_spectrogram(audio, padding=N_SAMPLES) as used by transcribe.
+    """
+
+    def __init__(self, filters):
+        self.filters = np.asarray(filters, dtype=np.float32)
+        # torch.hann_window is periodic
+        self.window = np.hanning(N_FFT + 1)[:-1].astype(np.float32)
+        self.mel = np.full((self.filters.shape[0], N_FRAMES), SILENCE, dtype=np.float32)
+        self.frames = 0
+        self.samples = 0
+        # audio from the start of the next frame's window on
+        self.pending = np.empty(0, dtype=np.float32)
+        self.started = False
+
+    def feed(self, audio):
+        """Add float32 samples and compute every frame they complete"""
+        self.samples += len(audio)
+        self.pending = np.concatenate([self.pending, audio])
+        if not self.started:
+            if len(self.pending) <= N_FFT // 2:
+                return
+            self._reflect_start()
+        self._compute_frames()
+
+    def finish(self):
+        """
+        (normalized mel, content frames). The buffer holds at least one 30 s
+        window past the audio, like whisper's padded spectrogram
+        """
+        # whisper pads the audio with 30 s of zeros before the STFT
+        self.pending = np.concatenate([self.pending, np.zeros(N_FFT, dtype=np.float32)])
+        if not self.started:
+            self._reflect_start()
+        self._compute_frames()
+        content_frames = self.samples // HOP_LENGTH
+        self._reserve(content_frames + N_FRAMES)
+
+        mel = self.mel[:, :content_frames + N_FRAMES]
+        np.maximum(mel, mel.max() - 8.0, out=mel)
+        mel += 4.0
+        mel /= 4.0
+        return mel, content_frames
+
+    def _reflect_start(self):
+        # torch.stft(center=True) reflects the first half window around the first sample
+        self.pending = np.concatenate([self.pending[N_FFT // 2:0:-1], self.pending])
+        self.started = True
+
+    def _reserve(self, frames):
+        if frames <= self.mel.shape[1]:
+            return
+        # grow by whole 30 s windows so the tail is already padded
+        size = max(self.mel.shape[1] * 2, -(-frames // N_FRAMES) * N_FRAMES)
+        grown = np.full((self.mel.shape[0], size), SILENCE, dtype=np.float32)
+        grown[:, :self.frames] = self.mel[:, :self.frames]
+        self.mel = grown
+
+    def _compute_frames(self):
+        if len(self.pending) < N_FFT:
+            return
+        count = (len(self.pending) - N_FFT) // HOP_LENGTH + 1
+        windows = np.lib.stride_tricks.sliding_window_view(self.pending, N_FFT)[::HOP_LENGTH][:count]
+        power = np.abs(np.fft.rfft(windows * self.window, axis=1)) ** 2
+        mel = self.filters @ power.T.astype(np.float32)
+        self._reserve(self.frames + count)
+        np.log10(np.maximum(mel, 1e-10), out=self.mel[:, self.frames:self.frames + count])
+        self.frames += count
+        self.pending = self.pending[count * HOP_LENGTH:]
+
+
+def decode_mel(model, mel, content_frames, language=None, initial_prompt=None,
+               temperature=(0.0, 0.2, 0.4, 0.6, 0.8, 1.0), compression_ratio_threshold=2.4,
+               logprob_threshold=-1.0, no_speech_threshold=0.6, condition_on_previous_text=True,
+               fp16=True, **decode_options):
+    """
+    whisper.transcribe's loop over a finished log-mel spectrogram: each 30 s
+    window is decoded with temperature fallback, skipped if it is silence, and
+    the next window starts after the last complete segment.
+    Returns whisper's result dict without per-segment details.
+    """
+    import torch
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+
+    fp16 = fp16 and model.device.type != "cpu"
+    mel = torch.from_numpy(mel).to(model.device, torch.float16 if fp16 else torch.float32)
+    temperatures = (temperature,) if isinstance(temperature, (int, float)) else temperature
+    if not model.is_multilingual:
+        language = "en"
+    if language is None:
+        # transcribe detects on the padded spectrogram's first window, padding frames included
+        _, probs = model.detect_language(mel[:, :N_FRAMES])
+        language = max(probs, key=probs.get)
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                              language=language, task="transcribe")
+    input_stride = N_FRAMES // model.dims.n_audio_ctx
+
+    prompt = tokenizer.encode(" " + initial_prompt.strip()) if initial_prompt else []
+    texts = []
+    seek = 0
+    while seek < content_frames:
+        segment_size = min(N_FRAMES, content_frames - seek)
+        # like transcribe, the encoder sees zeros rather than the padding's normalized silence
+        segment = whisper.audio.pad_or_trim(mel[:, seek:seek + segment_size], N_FRAMES)
+        for t in temperatures:
+            options = dict(decode_options)
+            if t > 0:
+                options.pop("beam_size", None)
+                options.pop("patience", None)
+            else:
+                options.pop("best_of", None)
+            result = whisper.decode(model, segment, whisper.DecodingOptions(
+                language=language, temperature=t, prompt=prompt, fp16=fp16, **options))
+            low_logprob = logprob_threshold is not None and result.avg_logprob < logprob_threshold
+            needs_fallback = low_logprob or (compression_ratio_threshold is not None
+                                             and result.compression_ratio > compression_ratio_threshold)
+            if no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold and low_logprob:
+                # silence, which no temperature will improve
+                needs_fallback = False
+            if not needs_fallback:
+                break
+
+        if no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold and \
+                (logprob_threshold is None or result.avg_logprob <= logprob_threshold):
+            seek += segment_size
+            continue
+
+        tokens = result.tokens
+        timestamps = [token >= tokenizer.timestamp_begin for token in tokens]
+        ends = [i + 1 for i in range(len(tokens) - 1) if timestamps[i] and timestamps[i + 1]]
+        if ends and timestamps[-2:] != [False, True]:
+            # the last segment runs past the window, decode it again from its start
+            tokens = tokens[:ends[-1]]
+            seek += max(1, (tokens[-1] - tokenizer.timestamp_begin) * input_stride)
+        else:
+            seek += segment_size
+        texts.append(tokenizer.decode(tokens))
+
+        if condition_on_previous_text and result.temperature <= 0.5:
+            prompt = prompt + tokens
+        else:
+            prompt = []
+    return {"text": "".join(texts), "language": language, "segments": []}
+
+
+class MelTranscriber:
+    """
+    Compute the log-mel spectrogram in the capture loop, so after Stop only
+    the encoder and decoder are left to run. It has StreamingTranscriber's
+    notify()/finish() interface, so record_audio and transcribe_recording
+    treat it the same way. Only PyTorch whisper models decode from features.
+    """
+
+    def __init__(self, model, audio, decode_options=None):
+        import whisper
+        self.model = model
+        self.audio = audio
+        self.decode_options = dict(decode_options or {})
+        self.features = IncrementalLogMel(whisper.audio.mel_filters("cpu", model.dims.n_mels).numpy())
+        self.fed = 0
+        # StreamingTranscriber's flag for abandoning a recording, nothing runs in the background here
+        self.stopping = threading.Event()
+
+    def start(self):
+        return self
+
+    def notify(self):
+        """Compute the frames completed by audio written since the last call"""
+        end = len(self.audio)
+        if end > self.fed:
+            self.features.feed(self.audio.float32(self.fed, end))
+            self.fed = end
+
+    def finish(self):
+        """Finish the spectrogram and decode it, returning the text"""
+        self.notify()
+        mel, content_frames = self.features.finish()
+        try:
+            result = decode_mel(self.model, mel, content_frames, **self.decode_options)
+        except Exception as e:
+            return f"Transcription error: {e}"
+        if "language" not in self.decode_options:
+            asr_engines.remember_language(result)
+        return result["text"]
@@ -0,0 +1,182 @@
+import json
+import random
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = "def main():\n    for i in range(10):\n        print(i)\n\n\nif __name__ == \"__main__\":\n    main()\n"
+
+
+class MockLLMServer:
+    """
+    Local stand-in for the Anthropic Messages API and the Gemini REST API.
+
+    Answers both plain and streaming (SSE) requests with a canned response,
+    waiting first_token_delay seconds before the first chunk and chunk_delay
+    seconds between chunks; jitter adds a random 0..jitter seconds to the
+    first delay of each request. Point send_to_bot at it with
+    ANTHROPIC_BASE_URL / GEMINI_API_ENDPOINT or its CLAUDE_BASE_URL /
+    GEMINI_ENDPOINT globals. Given a certfile (PEM holding both the
+    certificate and key) it serves HTTPS instead.
+    """
+
+    def __init__(self, response=DEFAULT_RESPONSE, first_token_delay=0.5, chunk_delay=0.02,
+                 chunk_size=8, port=0, certfile=None, jitter=0.0):
+        self.response = response
+        self.first_token_delay = first_token_delay
+        self.jitter = jitter
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.requests = 0
+        # streams the client hung up on before they were complete
+        self.aborted = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.scheme = "http"
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+            self.scheme = "https"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def chunks(self):
+        text = self.response
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                mock.requests += 1
+                if ":countTokens" not in self.path:
+                    time.sleep(mock.first_token_delay + random.uniform(0, mock.jitter))
+
+                if self.path.startswith("/v1/messages"):
+                    if body.get("stream"):
+                        self.send_events(anthropic_events(mock))
+                    else:
+                        self.send_json(anthropic_message(mock.response))
+                elif ":streamGenerateContent" in self.path:
+                    self.send_events(("", gemini_chunk(chunk)) for chunk in mock.chunks())
+                elif ":countTokens" in self.path:
+                    self.send_json({"totalTokens": 2})
+                elif ":generateContent" in self.path:
+                    self.send_json(gemini_chunk(mock.response))
+                else:
+                    self.send_error(404)
+
+            def do_GET(self):
+                mock.requests += 1
+                if self.path.startswith("/v1/models"):
+                    self.send_json({"data": [], "has_more": False, "first_id": None, "last_id": None})
+                else:
+                    self.send_error(404)
+
+            def send_json(self, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_events(self, events):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                first = True
+                self.close_connection = True
+                for event, payload in events:
+                    if not first:
+                        time.sleep(mock.chunk_delay)
+                    first = False
+                    line = f"event: {event}\n" if event else ""
+                    line += f"data: {json.dumps(payload)}\n\n"
+                    try:
+                        self.wfile.write(line.encode())
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        mock.aborted += 1
+                        return
+
+        return Handler
+
+
+def anthropic_message(text):
+    return {
+        "id": "msg_mock",
+        "type": "message",
+        "role": "assistant",
+        "model": "mock",
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 10, "output_tokens": len(text) // 4},
+    }
+
+
+def anthropic_events(mock):
+    message = anthropic_message("")
+    message["content"] = []
+    message["stop_reason"] = None
+    yield "message_start", {"type": "message_start", "message": message}
+    yield "content_block_start", {"type": "content_block_start", "index": 0,
+                                  "content_block": {"type": "text", "text": ""}}
+    for chunk in mock.chunks():
+        yield "content_block_delta", {"type": "content_block_delta", "index": 0,
+                                      "delta": {"type": "text_delta", "text": chunk}}
+    yield "content_block_stop", {"type": "content_block_stop", "index": 0}
+    yield "message_delta", {"type": "message_delta",
+                            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                            "usage": {"output_tokens": len(mock.response) // 4}}
+    yield "message_stop", {"type": "message_stop"}
+
+
+def gemini_chunk(text):
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": len(text) // 4},
+    }
+
+
+if __name__ == "__main__":
+    with MockLLMServer() as server:
+        print(f"Mock LLM server listening on {server.url}")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
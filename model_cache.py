@@ -0,0 +1,128 @@
+import gc
+import sys
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# Approximate fp32 weight sizes, used to make room before a model is loaded
+MODEL_SIZES_MB = {
+    "tiny": 150,
+    "base": 290,
+    "small": 970,
+    "medium": 3060,
+    "large": 6170,
+    "turbo": 3240,
+}
+
+
+def model_size_mb(model):
+    """Memory held by a model's parameters and buffers"""
+    if hasattr(model, "size_mb"):
+        # engines from asr_engines estimate their own size
+        return model.size_mb()
+    tensors = list(model.parameters()) + list(model.buffers())
+    for module in model.modules():
+        # dynamically quantized layers keep their weights in packed params, not parameters
+        if hasattr(module, "_weight_bias"):
+            tensors.extend(t for t in module._weight_bias() if t is not None)
+    return sum(t.numel() * t.element_size() for t in tensors) / (1024 * 1024)
+
+
+def load_whisper_model(name):
+    import whisper
+    return whisper.load_model(name)
+
+
+def warm_model(model):
+    """Run one short decode so the first real dictation skips one-time setup costs"""
+    model.transcribe(np.zeros(16000, dtype=np.float32), language="en")
+
+
+class WhisperModelCache:
+    """
+    LRU cache of loaded whisper models kept under a memory budget.
+
+    Models are loaded with loader (whisper.load_model by default, see
+    asr_engines.load_engine for the other backends) and warmed
+    with a dummy decode. Least recently used models are dropped before a new
+    one is loaded so two large models are not held at once unless they fit.
+    Load and warm times are kept in timings.
+    """
+
+    def __init__(self, memory_budget_mb=4096, loader=None, warm=True):
+        self.memory_budget_mb = memory_budget_mb
+        self.loader = loader or load_whisper_model
+        self.warm = warm
+        self.models = OrderedDict()
+        self.sizes = {}
+        self.timings = {}
+        self.lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self.models
+
+    def used_mb(self):
+        return sum(self.sizes.values())
+
+    def will_evict(self, name):
+        """Names of the models that loading name would drop"""
+        if name in self.models:
+            return []
+        needed = MODEL_SIZES_MB.get(name, 0)
+        evicted = []
+        used = self.used_mb()
+        for cached in self.models:
+            if used + needed <= self.memory_budget_mb:
+                break
+            evicted.append(cached)
+            used -= self.sizes[cached]
+        return evicted
+
+    def get(self, name):
+        """Return the model, loading and warming it if it is not cached"""
+        with self.lock:
+            if name in self.models:
+                self.models.move_to_end(name)
+                return self.models[name]
+
+            for evicted in self.will_evict(name):
+                self.evict(evicted)
+
+            start = time.perf_counter()
+            model = self.loader(name)
+            load_s = time.perf_counter() - start
+
+            warm_s = 0.0
+            if self.warm:
+                start = time.perf_counter()
+                try:
+                    warm_model(model)
+                except Exception as e:
+                    print(f"Error warming {name} model: {e}")
+                warm_s = time.perf_counter() - start
+
+            self.models[name] = model
+            self.sizes[name] = model_size_mb(model)
+            self.timings[name] = {"load_s": load_s, "warm_s": warm_s}
+            print(f"Loaded {name} model in {load_s:.2f}s, warmed in {warm_s:.2f}s "
+                  f"({self.sizes[name]:.0f} MB, cache {self.used_mb():.0f}/{self.memory_budget_mb} MB)")
+
+            # a model bigger than its estimate can still push the cache over budget
+            while self.used_mb() > self.memory_budget_mb and len(self.models) > 1:
+                self.evict(next(iter(self.models)))
+            return model
+
+    def evict(self, name):
+        self.models.pop(name, None)
+        self.sizes.pop(name, None)
+        gc.collect()
+        # only free cached GPU memory if torch is in use already
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def clear(self):
+        with self.lock:
+            for name in list(self.models):
+                self.evict(name)
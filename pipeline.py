@@ -0,0 +1,123 @@
+import itertools
+import queue
+import threading
+import time
+
+
+class Utterance:
+    """One dictation moving through the pipeline"""
+
+    ids = itertools.count(1)
+
+    def __init__(self, recording, code=None, streamer=None):
+        self.id = next(self.ids)
+        self.recording = recording
+        self.streamer = streamer
+        # None means: build on the result of the previous utterance
+        self.code = code
+        self.transcript = None
+        self.response = None
+        self.error = None
+        self.times = {"captured": time.perf_counter()}
+
+
+class DictationPipeline:
+    """
+    Runs transcription and the LLM call of consecutive utterances concurrently.
+
+    Captured utterances go into a bounded ASR queue; a single ASR worker
+    transcribes them into a bounded LLM queue; a single LLM worker sends them
+    on. With one worker per stage results come out in the order they were
+    recorded, and on_result is called for each. An utterance recorded while
+    earlier ones are still in flight is sent with the code produced by the
+    one before it, or with the code that one was based on if it failed.
+    submit() blocks when the ASR queue is full.
+    """
+
+    def __init__(self, transcribe, respond, on_result, queue_size=2):
+        self.transcribe = transcribe
+        self.respond = respond
+        self.on_result = on_result
+        self.asr_queue = queue.Queue(maxsize=queue_size)
+        self.llm_queue = queue.Queue(maxsize=queue_size)
+        self.in_flight = 0
+        self.last_code = ""
+        self.lock = threading.Lock()
+        self.latencies = {"queued": [], "asr": [], "llm": [], "total": []}
+        self.workers = [
+            threading.Thread(target=self._asr_worker, daemon=True),
+            threading.Thread(target=self._llm_worker, daemon=True),
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, recording, code, streamer=None):
+        """Queue a finished recording; code is the editor text when it was captured"""
+        with self.lock:
+            chained = self.in_flight > 0
+            self.in_flight += 1
+        utterance = Utterance(recording, None if chained else code, streamer)
+        self.asr_queue.put(utterance)
+        return utterance
+
+    def close(self):
+        self.asr_queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def _asr_worker(self):
+        while True:
+            utterance = self.asr_queue.get()
+            if utterance is None:
+                self.llm_queue.put(None)
+                return
+            utterance.times["asr_start"] = time.perf_counter()
+            try:
+                utterance.transcript = self.transcribe(utterance)
+            except Exception as e:
+                utterance.error = f"Transcription error: {e}"
+            utterance.times["asr_end"] = time.perf_counter()
+            self.llm_queue.put(utterance)
+
+    def _llm_worker(self):
+        while True:
+            utterance = self.llm_queue.get()
+            if utterance is None:
+                return
+            if utterance.code is None:
+                utterance.code = self.last_code
+            else:
+                # a new chain starts from the editor text, which stays the base if this request fails
+                self.last_code = utterance.code
+            utterance.times["llm_start"] = time.perf_counter()
+            if utterance.error is None:
+                try:
+                    utterance.response = self.respond(utterance)
+                    self.last_code = utterance.response
+                except Exception as e:
+                    utterance.error = f"LLM error: {e}"
+            utterance.times["llm_end"] = time.perf_counter()
+            self._record(utterance)
+            with self.lock:
+                self.in_flight -= 1
+            self.on_result(utterance)
+
+    def _record(self, utterance):
+        times = utterance.times
+        self.latencies["queued"].append(times["asr_start"] - times["captured"])
+        self.latencies["asr"].append(times["asr_end"] - times["asr_start"])
+        self.latencies["llm"].append(times["llm_end"] - times["llm_start"])
+        self.latencies["total"].append(times["llm_end"] - times["captured"])
+
+    def stats(self):
+        """Queue depths and the average latency of each stage in seconds"""
+        averages = {
+            stage: sum(values) / len(values) if values else 0.0
+            for stage, values in self.latencies.items()
+        }
+        return {
+            "in_flight": self.in_flight,
+            "asr_queue": self.asr_queue.qsize(),
+            "llm_queue": self.llm_queue.qsize(),
+            **{f"{stage}_s": value for stage, value in averages.items()},
+        }
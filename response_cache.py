@@ -0,0 +1,125 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_FILE = "response_cache.sqlite3"
+
+
+def normalize_transcript(text):
+    """Case-, whitespace- and trailing punctuation-fold a dictation for cache lookups"""
+    return re.sub(r"\s+", " ", text).strip().casefold().rstrip(".!?,;: ")
+
+
+def cache_key(model_id, sys_prompt, language, text, code=""):
+    """
+    Key of a request. Only the dictation is normalized, the editor code is
+    kept exact because indentation and case matter there.
+    """
+    payload = json.dumps([model_id, sys_prompt, language, code, normalize_transcript(text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of LLM responses.
+
+    An in-memory LRU of memory_entries sits in front of a SQLite table.
+    Entries older than ttl_seconds are ignored and purged, and the table is
+    trimmed to max_entries by last access. Hit and miss counts are kept for
+    stats().
+    """
+
+    def __init__(self, path=CACHE_FILE, memory_entries=256, max_entries=5000, ttl_seconds=7 * 24 * 3600):
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        # WAL without a full sync per commit keeps disk hits well under a millisecond
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.purge_expired()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl_seconds:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+
+            row = self.db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.memory.pop(key, None)
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        with self.lock:
+            self._remember(key, response, now)
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now))
+            count = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self.db.execute("""
+                    DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed LIMIT ?
+                    )
+                """, (count - self.max_entries,))
+            self.db.commit()
+
+    def _remember(self, key, response, created):
+        self.memory[key] = (response, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def purge_expired(self):
+        with self.lock:
+            self.db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+            self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
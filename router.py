@@ -0,0 +1,87 @@
+import re
+import threading
+import send_to_bot
+
+# Model ids per tier and provider; the large tier is what every request used before routing
+TIERS = {
+    "small": {"Claude": "claude-3-5-haiku-20241022", "Gemini": "gemini-2.0-flash-lite"},
+    "large": {"Claude": send_to_bot.CLAUDE_MODEL, "Gemini": send_to_bot.GEMINI_MODEL},
+}
+
+# Dictations that ask for one of these are sent to the large tier
+LARGE_CHANGE_WORDS = re.compile(
+    r"\b(refactor|rewrite|restructure|redesign|implement|convert|translate|migrate|optimi[sz]e|"
+    r"class(es)?|module|every|all|entire|whole|tests?|algorithm|parser|server|api)\b",
+    re.IGNORECASE
+)
+# Transcripts longer than this many words describe more than a small edit
+LARGE_TRANSCRIPT_WORDS = 40
+# Files longer than this many lines are sent to the large tier, which keeps them intact more reliably
+LARGE_CODE_LINES = 150
+
+# Rough characters per token for code, used to size max_tokens
+CHARS_PER_TOKEN = 3
+# Output allowance on top of the existing code, per tier
+NEW_CODE_TOKENS = {"small": 512, "large": 2048}
+MIN_TOKENS = 256
+MAX_TOKENS = 8192
+
+stats_lock = threading.Lock()
+tier_stats = {}
+
+
+def classify(text, code="", edit_mode=False):
+    """
+    Pick a tier for a dictation with cheap local heuristics: the number of
+    words, words that ask for large changes and the size of the code.
+    Returns (tier, max_tokens).
+    """
+    words = len(text.split())
+    code_lines = code.count("\n") + 1 if code else 0
+    large = (words > LARGE_TRANSCRIPT_WORDS or LARGE_CHANGE_WORDS.search(text) is not None
+             or code_lines > LARGE_CODE_LINES)
+    tier = "large" if large else "small"
+    return tier, max_tokens_for(tier, code, edit_mode)
+
+def max_tokens_for(tier, code="", edit_mode=False):
+    """
+    Output budget for a request. A full rewrite returns the existing code as
+    well, so it has to fit; edits only return the changed blocks.
+    """
+    tokens = NEW_CODE_TOKENS[tier]
+    if code and not edit_mode:
+        tokens += int(len(code) / CHARS_PER_TOKEN * 1.2)
+    return max(MIN_TOKENS, min(MAX_TOKENS, tokens))
+
+def route(provider, text, code="", edit_mode=False):
+    """(tier, model id, max_tokens) for a request to provider"""
+    tier, max_tokens = classify(text, code, edit_mode)
+    return tier, TIERS[tier][provider], max_tokens
+
+def record(tier, latency_s, usage=None, truncated=False):
+    """Add one request to the per-tier stats used to tune the thresholds"""
+    usage = usage or {}
+    with stats_lock:
+        stats = tier_stats.setdefault(tier, {"requests": 0, "latency_s": 0.0, "input_tokens": 0,
+                                             "output_tokens": 0, "truncated": 0})
+        stats["requests"] += 1
+        stats["latency_s"] += latency_s
+        stats["input_tokens"] += usage.get("input_tokens", 0)
+        stats["output_tokens"] += usage.get("output_tokens", 0)
+        stats["truncated"] += truncated
+    print(f"Routed to {tier} tier: {latency_s:.2f}s, {usage.get('output_tokens', 0)} output tokens"
+          + (", truncated" if truncated else ""))
+
+def summary():
+    """Average latency and tokens per request for each tier"""
+    with stats_lock:
+        return {
+            tier: {
+                "requests": stats["requests"],
+                "avg_latency_s": stats["latency_s"] / stats["requests"],
+                "avg_input_tokens": stats["input_tokens"] / stats["requests"],
+                "avg_output_tokens": stats["output_tokens"] / stats["requests"],
+                "truncated": stats["truncated"],
+            }
+            for tier, stats in tier_stats.items()
+        }
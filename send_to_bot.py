@@ -1,44 +1,358 @@
-import anthropic
 import os
-import google.generativeai as genai
+import threading
+import time
+import importlib.util
+from re import sub
 
+# Point the SDKs at another server, e.g. mock_llm_server for local testing
+CLAUDE_BASE_URL = os.environ.get("ANTHROPIC_BASE_URL")
+GEMINI_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT")
 
-def send_text(text, model, key, language):
-    sys_prompt = "write a template for the following message, do not add any comments, commentary, or other text other than the code. Your response should be as simple as possible, using as few characters as possible. Assume you are writing " + language + " code. Messages before the code such as \"Sure, here is a X\", or \"Here's a X\" are considered unnecessary text. If provided codee in prompt, do not delete any code unless instructed otherwise"
+FENCE_PATTERN = r"```\w*|\w*```"
 
+CLAUDE_MODEL = "claude-3-7-sonnet-20250219"
+GEMINI_MODEL = "gemini-2.0-flash"
+MODEL_IDS = {"Claude": CLAUDE_MODEL, "Gemini": GEMINI_MODEL}
+DEFAULT_MAX_TOKENS = 1000
+
+# With routing on, each request picks a model tier and max_tokens from its size (see router.py)
+ROUTING_ENABLED = False
+
+# Repeated prompts are answered from response_cache when this is on
+CACHE_ENABLED = True
+response_cache = None
+last_cache_hit = False
+
+# Token usage of the last request, including Claude's prompt cache reads and writes
+last_usage = {}
+# "max_tokens" when the last response was cut off by the output limit
+last_stop_reason = None
+
+# HTTP/2 needs the optional h2 package, fall back to keep-alive HTTP/1.1 without it
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Clients are kept per (provider, key, Gemini model) so connections survive between dictations
+clients = {}
+clients_lock = threading.Lock()
+gemini_configured_key = None
+
+
+def system_prompt(language):
+    return "write a template for the following message, do not add any comments, commentary, or other text other than the code. Your response should be as simple as possible, using as few characters as possible. Assume you are writing " + language + " code. Messages before the code such as \"Sure, here is a X\", or \"Here's a X\" are considered unnecessary text. If provided codee in prompt, do not delete any code unless instructed otherwise"
+
+def strip_fences(text):
+    """Remove markdown code fences from a model response"""
+    return sub(FENCE_PATTERN, "", text)
+
+class FenceStripper:
+    """
+    Strip code fences from a streamed response chunk by chunk.
+    A fence never spans a newline, so complete lines can be cleaned and
+    released straight away while the partial last line is held back.
+    """
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, chunk):
+        self.pending += chunk
+        cut = self.pending.rfind("\n") + 1
+        if not cut:
+            return ""
+        ready, self.pending = self.pending[:cut], self.pending[cut:]
+        return strip_fences(ready)
+
+    def flush(self):
+        ready, self.pending = self.pending, ""
+        return strip_fences(ready)
+
+def get_response_cache():
+    global response_cache
+    with clients_lock:
+        if response_cache is None:
+            import response_cache as cache_module
+            response_cache = cache_module.ResponseCache()
+    return response_cache
+
+def cached_response(model, sys_prompt, language, text, code="", model_id=None, lookup=True):
+    """
+    Return (cache key, cached response or None) and record whether it was a hit.
+    With lookup=False only the key is returned, for storing the response later
+    """
+    global last_cache_hit
+    last_cache_hit = False
+    if not CACHE_ENABLED or model not in MODEL_IDS:
+        return None, None
+    import response_cache as cache_module
+    cache_key = cache_module.cache_key(model_id or MODEL_IDS[model], sys_prompt, language, text, code)
+    if not lookup:
+        return cache_key, None
+    response = get_response_cache().get(cache_key)
+    last_cache_hit = response is not None
+    return cache_key, response
+
+def send_text(text, model, key, language, code="", edit_mode=False):
+    """
+    Send the dictated text to the model, after the current editor code if given.
+    Keeping the code separate lets Claude cache it as a stable prompt prefix.
+    With edit_mode the model is asked for search/replace blocks against the
+    code instead of the whole file (see edits.py).
+    With model "Race" key maps providers to API keys and every provider is
+    asked at once through async_bot.race.
+    """
+    if model == "Race":
+        import async_bot
+        return async_bot.run(async_bot.race(text, key, language, code, edit_mode), timeout=None)
+    if model not in MODEL_IDS:
+        raise ValueError(f"Unknown model: {model}")
+    sys_prompt = system_prompt(language)
+    if edit_mode and code:
+        import edits
+        sys_prompt = edits.edit_prompt(sys_prompt)
+    tier, model_id, max_tokens = route(model, text, code, edit_mode)
+    cache_key, response = cached_response(model, sys_prompt, language, text, code, model_id)
+    if response is not None:
+        return response
+
+    start = time.perf_counter()
+    if model == "Claude":
+        response = send_to_claude(text, key, language, sys_prompt, code, model_id, max_tokens)
+    if model == "Gemini":
+        response = send_to_gemini(code + text, key, language, sys_prompt, model_id, max_tokens)
+    if tier:
+        truncated = last_stop_reason == "max_tokens"
+        record_route(tier, start, truncated)
+        if truncated:
+            # a cut-off file is worse than a slow one, so ask the large tier with the full budget
+            import router
+            model_id, max_tokens = router.TIERS["large"][model], router.MAX_TOKENS
+            start = time.perf_counter()
+            if model == "Claude":
+                response = send_to_claude(text, key, language, sys_prompt, code, model_id, max_tokens)
+            if model == "Gemini":
+                response = send_to_gemini(code + text, key, language, sys_prompt, model_id, max_tokens)
+            record_route("large", start, last_stop_reason == "max_tokens")
+            cache_key = cached_response(model, sys_prompt, language, text, code, model_id)[0]
+    if cache_key:
+        get_response_cache().put(cache_key, response)
+    return response
+
+def stream_text(text, model, key, language, code=""):
+    """Like send_text, but yields the response as it is generated"""
+    if model == "Race":
+        yield send_text(text, model, key, language, code)
+        return
+    if model not in MODEL_IDS:
+        raise ValueError(f"Unknown model: {model}")
+    sys_prompt = system_prompt(language)
+    tier, model_id, max_tokens = route(model, text, code, streamed=True)
+    cache_key, response = cached_response(model, sys_prompt, language, text, code, model_id)
+    if response is not None:
+        yield response
+        return
+
+    pieces = []
+    start = time.perf_counter()
     if model == "Claude":
-        text = send_to_claude(text, key, language, sys_prompt)
+        for chunk in stream_from_claude(text, key, language, sys_prompt, code, model_id, max_tokens):
+            pieces.append(chunk)
+            yield chunk
     if model == "Gemini":
-        text = send_to_gemini(text, key, language,)
-    return (text)
+        for chunk in stream_from_gemini(code + text, key, language, sys_prompt, model_id, max_tokens):
+            pieces.append(chunk)
+            yield chunk
+    truncated = last_stop_reason == "max_tokens"
+    if tier:
+        record_route(tier, start, truncated)
+    # a cut-off file must not come back on every repeat of the prompt
+    if cache_key and pieces and not truncated:
+        get_response_cache().put(cache_key, "".join(pieces))
 
-def send_to_claude(text, key, language, sys_prompt):
+def route(model, text, code="", edit_mode=False, model_id=None, streamed=False):
+    """
+    (tier, model id, max_tokens) for a request. Without routing, or when the
+    model id is already fixed, the tier and max_tokens are None (provider default)
+    A streamed reply is already shown when it is cut off and cannot be asked
+    again on the large tier, so it gets the full output budget
+    """
+    if not ROUTING_ENABLED or model_id or model not in MODEL_IDS:
+        return None, model_id, None
+    import router
+    tier, model_id, max_tokens = router.route(model, text, code, edit_mode)
+    return tier, model_id, router.MAX_TOKENS if streamed else max_tokens
 
-    client = anthropic.Anthropic(api_key=key)
-    message = client.messages.create(
-        model="claude-3-7-sonnet-20250219",
-        max_tokens=1000,
+def record_route(tier, start, truncated=False):
+    import router
+    router.record(tier, time.perf_counter() - start, last_usage, truncated)
+
+def claude_message_args(text, sys_prompt, code="", model_id=None, max_tokens=None):
+    """
+    Request arguments with prompt-cache breakpoints after the system prompt
+    and after the editor code, so repeated edits of the same file only pay
+    full price for the new dictation
+    """
+    content = []
+    if code:
+        content.append({
+            "type": "text",
+            "text": code,
+            "cache_control": {"type": "ephemeral"}
+        })
+    content.append({
+        "type": "text",
+        "text": text
+    })
+    return dict(
+        model=model_id or CLAUDE_MODEL,
+        max_tokens=max_tokens or DEFAULT_MAX_TOKENS,
         temperature=1,
-        system=sys_prompt,
+        system=[
+            {
+                "type": "text",
+                "text": sys_prompt,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ],
         messages=[
             {
                 "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": text
-                    }
-                ]
+                "content": content
             }
         ]
     )
+
+def record_usage(usage, first_token_s=None, stop_reason=None):
+    """Keep and print the token usage of a Claude response"""
+    global last_usage, last_stop_reason
+    last_stop_reason = stop_reason
+    last_usage = {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+    }
+    if first_token_s is not None:
+        last_usage["first_token_s"] = first_token_s
+    print(f"Claude usage: {last_usage}")
+
+def record_gemini_usage(response):
+    """Keep the token usage and finish reason of a Gemini response, where the SDK reports them"""
+    global last_usage, last_stop_reason
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        last_usage = {"input_tokens": usage.prompt_token_count,
+                      "output_tokens": usage.candidates_token_count}
+    try:
+        finish_reason = response.candidates[0].finish_reason.name
+    except (AttributeError, IndexError):
+        finish_reason = None
+    last_stop_reason = "max_tokens" if finish_reason == "MAX_TOKENS" else finish_reason
+
+# The provider SDKs are slow to import, so each one is only loaded on first use
+
+def configure_gemini(gemini_key):
+    global gemini_configured_key
+    if gemini_key == gemini_configured_key:
+        return
+    import google.generativeai as genai
+    if GEMINI_ENDPOINT:
+        genai.configure(api_key=gemini_key, transport="rest",
+                        client_options={"api_endpoint": GEMINI_ENDPOINT})
+    else:
+        genai.configure(api_key=gemini_key)
+    gemini_configured_key = gemini_key
+
+def create_client(provider, key, model_id=None):
+    if provider == "Claude":
+        import anthropic
+        import httpx
+        http_client = anthropic.DefaultHttpxClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=300)
+        )
+        return anthropic.Anthropic(api_key=key, base_url=CLAUDE_BASE_URL, http_client=http_client)
+    if provider == "Gemini":
+        import google.generativeai as genai
+        configure_gemini(key)
+        return genai.GenerativeModel(model_id or GEMINI_MODEL)
+    raise ValueError(f"Unknown provider: {provider}")
+
+def get_client(provider, key, model_id=None):
+    """Return the shared client for this provider and key, creating it on first use"""
+    # a Gemini client is bound to its model, a Claude client serves every model
+    client_key = (provider, key, model_id if provider == "Gemini" else None)
+    with clients_lock:
+        client = clients.get(client_key)
+        if client is None:
+            client = clients[client_key] = create_client(provider, key, model_id)
+    if provider == "Gemini":
+        # genai keeps the key in module state, so switch it back if another key was used since
+        with clients_lock:
+            configure_gemini(key)
+    return client
+
+def clear_clients():
+    """Drop every cached client and close its connections"""
+    global gemini_configured_key
+    with clients_lock:
+        for (provider, *_), client in clients.items():
+            if provider == "Claude":
+                client.close()
+        clients.clear()
+        gemini_configured_key = None
+
+def warm_up(provider, key):
+    """Open the connection to the provider ahead of the first dictation"""
+    try:
+        client = get_client(provider, key)
+        if provider == "Claude":
+            client.models.list(limit=1)
+        elif provider == "Gemini":
+            client.count_tokens("warm up")
+        return True
+    except Exception as e:
+        print(f"Error warming up {provider} client: {e}")
+        return False
+
+def send_to_claude(text, key, language, sys_prompt, code="", model_id=None, max_tokens=None):
+
+    client = get_client("Claude", key)
+    message = client.messages.create(**claude_message_args(text, sys_prompt, code, model_id, max_tokens))
+    record_usage(message.usage, stop_reason=message.stop_reason)
     return (message.content[0].text)
 
-def send_to_gemini(text, gemini_key, language, sys_prompt):
-    genai.configure(api_key=gemini_key)
-    model = genai.GenerativeModel("gemini-2.0-flash")
+def stream_from_claude(text, key, language, sys_prompt, code="", model_id=None, max_tokens=None):
+    client = get_client("Claude", key)
+    start = time.perf_counter()
+    first_token_s = None
+    with client.messages.stream(**claude_message_args(text, sys_prompt, code, model_id, max_tokens)) as stream:
+        for chunk in stream.text_stream:
+            if first_token_s is None:
+                first_token_s = time.perf_counter() - start
+            yield chunk
+        message = stream.get_final_message()
+        record_usage(message.usage, first_token_s, message.stop_reason)
+
+def gemini_generation_config(max_tokens):
+    return {"max_output_tokens": max_tokens} if max_tokens else None
+
+def send_to_gemini(text, gemini_key, language, sys_prompt, model_id=None, max_tokens=None):
+    model = get_client("Gemini", gemini_key, model_id)
     response = model.generate_content(
-        contents=(sys_prompt + text)
+        contents=(sys_prompt + text),
+        generation_config=gemini_generation_config(max_tokens)
     )
+    record_gemini_usage(response)
     return(response.text)
 
+def stream_from_gemini(text, gemini_key, language, sys_prompt, model_id=None, max_tokens=None):
+    model = get_client("Gemini", gemini_key, model_id)
+    response = model.generate_content(
+        contents=(sys_prompt + text),
+        generation_config=gemini_generation_config(max_tokens),
+        stream=True
+    )
+    for chunk in response:
+        yield chunk.text
+    record_gemini_usage(response)
+
+
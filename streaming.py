@@ -0,0 +1,117 @@
+import threading
+import asr_engines
+import audio_buffer
+
+# whisper always works on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+
+class StreamingTranscriber:
+    """
+    Transcribe audio on a worker thread while it is still being captured.
+
+    Every step_seconds of new audio the uncommitted part of the recording is
+    decoded again. Segments that end before the last tail_seconds are treated
+    as stable: their text is committed and their audio is never decoded again,
+    so when recording stops only the final window is left to transcribe.
+
+    The audio lives in an AudioBuffer. Pass the capture loop's own buffer and
+    call notify() after each write to avoid keeping a second copy, or feed
+    chunks with add_frames().
+
+    decode_options are passed on to every transcribe call; timestamps stay on
+    because the segment ends decide what is committed.
+    """
+
+    def __init__(self, model, audio=None, step_seconds=3.0, tail_seconds=4.0, window_seconds=25.0,
+                 decode_options=None):
+        self.model = model
+        self.decode_options = dict(decode_options or {}, without_timestamps=False)
+        self.step = int(step_seconds * SAMPLE_RATE)
+        self.tail = int(tail_seconds * SAMPLE_RATE)
+        self.window = int(window_seconds * SAMPLE_RATE)
+
+        self.audio = audio if audio is not None else audio_buffer.AudioBuffer()
+        self.committed_text = []
+        self.committed_samples = 0
+        self.decoded_samples = 0
+        self.passes = 0
+
+        self.new_audio = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def add_frames(self, data):
+        """Append a chunk of int16 audio"""
+        self.audio.write(data)
+        self.new_audio.set()
+
+    def notify(self):
+        """Signal that the shared buffer has grown"""
+        self.new_audio.set()
+
+    def finish(self):
+        """Stop the worker, decode the remaining tail and return the full text"""
+        self.stopping.set()
+        self.new_audio.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self._decode_pass(final=True)
+        return "".join(self.committed_text)
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.new_audio.wait(0.1)
+            self.new_audio.clear()
+            total = len(self.audio)
+            if total - self.decoded_samples >= self.step and not self.stopping.is_set():
+                self._decode_pass(final=False)
+
+    def _pending_audio(self):
+        end = len(self.audio)
+        return self.audio.float32(self.committed_samples, end), end
+
+    def _decode_pass(self, final):
+        start = self.committed_samples
+        audio, end = self._pending_audio()
+        self.decoded_samples = end
+        if audio.size == 0:
+            return
+
+        prompt = "".join(self.committed_text)[-200:] or None
+        try:
+            result = self.model.transcribe(audio, initial_prompt=prompt, **self.decode_options)
+        except Exception as e:
+            print(f"Streaming transcription error: {e}")
+            return
+        self.passes += 1
+        if "language" not in self.decode_options and asr_engines.speech_language(result):
+            # later passes over the same recording skip detection
+            asr_engines.remember_language(result)
+            self.decode_options["language"] = result["language"]
+        segments = result.get("segments", [])
+
+        if final:
+            self.committed_text.append(result["text"])
+            self.committed_samples = end
+            return
+
+        stable_end = audio.size - self.tail
+        if not segments:
+            # nothing was heard, so only the tail can still hold the start of speech
+            self.committed_samples = start + max(stable_end, 0)
+            return
+        if audio.size > self.window:
+            # the pending audio outgrew the window, keep everything but the last segment
+            stable_end = max(stable_end, int(segments[-1]["start"] * SAMPLE_RATE))
+
+        for segment in segments:
+            segment_end = int(segment["end"] * SAMPLE_RATE)
+            if segment_end > stable_end:
+                break
+            self.committed_text.append(segment["text"])
+            self.committed_samples = start + segment_end
@@ -1,59 +1,107 @@
-import pyaudio
 import time
-import whisper
 import io
 import wave
 import tempfile
 import os
 from pyperclip import copy, paste
 import send_to_bot
-from re import sub
-from pyautogui import hotkey
+import async_bot
 import threading
+import numpy as np
+import streaming
+import log_mel
+import audio_buffer
+import vad
+import audio_sources
+import edits
+import asr_engines
 
-CHUNK = 1024 * 8
-FORMAT = pyaudio.paInt16
+CHUNK = audio_sources.CHUNK
+SAMPLE_WIDTH = 2
 CHANNELS = 1
-RATE = 16000
+RATE = audio_sources.RATE
+NO_SPEECH = "No speech detected"
 
-# Remove global model and move initialization to functions
-p = None
-stream = None
-
-def init_audio():
-    """Initialize audio only"""
-    global p, stream
+def init_audio(source=None):
+    """Start the audio source, the microphone unless another source is given"""
     try:
-        p = pyaudio.PyAudio()
-        stream = p.open(
-            format=FORMAT,
-            channels=CHANNELS,
-            rate=RATE,
-            input=True,
-            output=True,
-            frames_per_buffer=CHUNK
-        )
-        return True
+        return (source or audio_sources.PyAudioSource(CHUNK)).start()
     except Exception as e:
         print(f"Error initializing audio: {e}")
-        return False
+        return None
+
+def as_samples(audio_frames):
+    """int16 samples from an AudioBuffer, a sample array or a list of captured chunks"""
+    if isinstance(audio_frames, audio_buffer.AudioBuffer):
+        return audio_frames.samples()
+    if isinstance(audio_frames, np.ndarray):
+        return audio_frames
+    buffer = bytearray(sum(len(frame) for frame in audio_frames))
+    offset = 0
+    for frame in audio_frames:
+        buffer[offset:offset + len(frame)] = frame
+        offset += len(frame)
+    return np.frombuffer(buffer, dtype=np.int16)
+
+def frames_to_float32(audio_frames):
+    """Convert captured int16 audio into the float32 array whisper expects"""
+    audio = as_samples(audio_frames).astype(np.float32)
+    audio /= 32768.0
+    return audio
+
+def write_wav(filename, audio_frames):
+    """Write captured int16 chunks to a WAV file"""
+    with wave.open(filename, 'wb') as wf:
+        wf.setnchannels(CHANNELS)
+        wf.setsampwidth(SAMPLE_WIDTH)
+        wf.setframerate(RATE)
+        wf.writeframes(as_samples(audio_frames))
 
-def transcribe_audio(audio_frames, model):
-    """Transcribe audio using the provided model"""
-    if not audio_frames:
+def load_audio_frames(filename, chunk=CHUNK):
+    """Read an audio file into int16 chunks shaped like a live capture"""
+    with open(filename, 'rb') as f:
+        is_wav = f.read(4) == b'RIFF'
+    if is_wav:
+        with wave.open(filename, 'rb') as wf:
+            if (wf.getnchannels(), wf.getsampwidth(), wf.getframerate()) == (CHANNELS, SAMPLE_WIDTH, RATE):
+                data = wf.readframes(wf.getnframes())
+                return [data[i:i + chunk * 2] for i in range(0, len(data), chunk * 2)]
+    # anything else goes through whisper's ffmpeg loader and is resampled to 16 kHz mono
+    import whisper
+    audio = whisper.load_audio(filename)
+    data = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+    return [data[i:i + chunk * 2] for i in range(0, len(data), chunk * 2)]
+
+def transcribe_audio(audio_frames, model, in_memory=True, decode_options=None):
+    """
+    Transcribe audio using the provided model
+    By default the frames are handed to whisper as a float32 array, skipping
+    the temp WAV file and the ffmpeg decode
+    decode_options are passed on to transcribe, see asr_engines.DECODE_PROFILES
+    Without a language in them the detected language is remembered for later calls
+    """
+    decode_options = decode_options or {}
+    if len(audio_frames) == 0:
         return "No audio to transcribe"
-   
+
+    if in_memory:
+        try:
+            result = model.transcribe(frames_to_float32(audio_frames), **decode_options)
+            if "language" not in decode_options:
+                asr_engines.remember_language(result)
+            return result["text"]
+        except Exception as e:
+            return f"Transcription error: {e}"
+
     with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
         temp_filename = temp_file.name
    
-    with wave.open(temp_filename, 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(p.get_sample_size(FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(b''.join(audio_frames))
+    write_wav(temp_filename, audio_frames)
    
     try:
-        result = model.transcribe(temp_filename)
+        result = model.transcribe(temp_filename, **decode_options)
+        if "language" not in decode_options:
+            asr_engines.remember_language(result)
         transcription = result["text"]
     except Exception as e:
         transcription = f"Transcription error: {e}"
@@ -62,58 +110,199 @@ def transcribe_audio(audio_frames, model):
    
     return transcription
 
-def cleanup():
-    global stream, p
-    if stream:
-        stream.stop_stream()
-        stream.close()
-    if p:
-        p.terminate()
+def transcribe_wav_streaming(filename, model, realtime=True, **options):
+    """
+    Feed an audio file through the streaming transcriber as if it were being
+    recorded, returning the text and the seconds from end of audio to final text
+    """
+    frames = load_audio_frames(filename)
+    streamer = streaming.StreamingTranscriber(model, **options).start()
+    for data in frames:
+        streamer.add_frames(data)
+        if realtime:
+            time.sleep(len(data) / 2 / RATE)
+    stopped = time.perf_counter()
+    text = streamer.finish()
+    return text, time.perf_counter() - stopped
 
-def record_and_transcribe(code, key, lang_model, language, stop_event, whisper_model=None):
+def send(text, lang_model, key, language, code="", edit_mode=False, cancel_event=None, timeout=None):
     """
-    Record audio until stop_event is set, then transcribe the audio
-    Now accepts the whisper model as a parameter
+    send_text, going through the async backend when cancel_event or timeout
+    is given so the request can be aborted (see async_bot.run)
     """
-    if not init_audio():
-        return "Failed to initialize audio"
+    if cancel_event is None and not timeout:
+        return send_to_bot.send_text(text, lang_model, key, language, code, edit_mode)
+    return async_bot.run(async_bot.send_text(text, lang_model, key, language, code, edit_mode),
+                         cancel_event, timeout)
+
+def stream_response(text, lang_model, key, language, on_chunk, code="", cancel_event=None, timeout=None):
+    """Send text to the LLM, passing fence-stripped chunks to on_chunk as they arrive"""
+    stripper = send_to_bot.FenceStripper()
+    pieces = []
+    
+    def emit(chunk):
+        pieces.append(stripper.feed(chunk))
+        if pieces[-1]:
+            on_chunk(pieces[-1])
+    
+    if cancel_event is None and not timeout:
+        for chunk in send_to_bot.stream_text(text, lang_model, key, language, code):
+            emit(chunk)
+    else:
+        async_bot.run(async_bot.stream_text(text, lang_model, key, language, emit, code),
+                      cancel_event, timeout)
+    pieces.append(stripper.flush())
+    if pieces[-1]:
+        on_chunk(pieces[-1])
+    return "".join(pieces)
+
+def request_edit(text, lang_model, key, language, code, cancel_event=None, timeout=None):
+    """
+    Ask the LLM for search/replace blocks against code and apply them.
+    Falls back to asking for the whole file if the reply has no blocks that
+    parse, since prose or malformed blocks must not replace the code, or if
+    the blocks do not apply.
+    """
+    response = send(text, lang_model, key, language, code, True, cancel_event, timeout)
+    blocks = edits.parse_blocks(response)
+    try:
+        if not blocks:
+            raise edits.EditError("no search/replace blocks in the reply")
+        new_code, changes = edits.apply_blocks(code, blocks)
+        print(f"Applied {len(changes)} edit(s) to the code")
+        return new_code
+    except edits.EditError as e:
+        print(f"Could not apply edits ({e}), asking for the whole file")
+    response = send(text, lang_model, key, language, code, cancel_event=cancel_event, timeout=timeout)
+    return send_to_bot.strip_fences(response)
+
+def trim_silence(audio_frames, detector=None):
+    """Drop non-speech from captured audio, returning the kept samples and VAD stats"""
+    detector = detector or vad.VoiceActivityDetector()
+    return detector.trim(as_samples(audio_frames))
+
+def cleanup(source):
+    source.stop()
+    print(f"Capture metrics: {source.metrics()}")
+
+def record_audio(stop_event, whisper_model=None, stream_transcription=False, auto_stop_seconds=0,
+                 source=None, decode_options=None, incremental_mel=False):
+    """
+    Capture audio until stop_event is set (or auto-stop kicks in).
+    Returns the recording and the streaming transcriber, if one was started,
+    or (None, None) if the audio source could not be opened
+    With incremental_mel a PyTorch whisper model gets a log_mel.MelTranscriber
+    instead, which computes the features as the audio arrives
+    """
+    source = init_audio(source)
+    if source is None:
+        return None, None
    
     try:
-        current_recording = []
+        current_recording = audio_buffer.AudioBuffer()
+        streamer = None
+        if stream_transcription and whisper_model and not asr_engines.has_segments(whisper_model):
+            # without segments nothing is committed, so every pass would decode the whole recording
+            print("This ASR engine cannot transcribe while recording, transcribing after stop")
+            stream_transcription = False
+        if stream_transcription and whisper_model:
+            streamer = streaming.StreamingTranscriber(whisper_model, current_recording,
+                                                     decode_options=decode_options).start()
+        elif incremental_mel and hasattr(whisper_model, "dims"):
+            streamer = log_mel.MelTranscriber(whisper_model, current_recording, decode_options).start()
+        detector = vad.VoiceActivityDetector() if auto_stop_seconds else None
         print("Recording started...")
        
         while not stop_event.is_set():
-            try:
-                data = stream.read(CHUNK, exception_on_overflow=False)
-                current_recording.append(data)
-            except Exception as e:
-                print(f"Error reading audio: {e}")
-                break
-            time.sleep(0.01)
+            # the source captures on its own thread, read only waits for the next chunk
+            data = source.read(timeout=0.5)
+            if data is None:
+                if source.exhausted:
+                    break
+                continue
+            current_recording.write(data)
+            if streamer:
+                streamer.notify()
+            if detector:
+                detector.update(data)
+                if detector.should_stop(auto_stop_seconds):
+                    print(f"Stopping after {detector.silence_seconds:.1f}s of silence")
+                    break
        
         print("Recording stopped, transcribing...")
-       
-        if current_recording:
-            text = code
-            
-            # Check if whisper model is provided
-            if whisper_model:
-                text += transcribe_audio(current_recording, whisper_model)
-            else:
-                text += "Error: No whisper model provided for transcription"
-                
-            print(f"Transcription: {text}")
-           
-            response = send_to_bot.send_text(text, lang_model, key, language)
-            response = sub(r"```\w*|\w*```", "", response)
-            copy(response)
-           
-            return response
-        else:
-            return "No audio was recorded"
+        return current_recording, streamer
    
     finally:
-        cleanup()
+        cleanup(source)
+
+def transcribe_recording(current_recording, whisper_model, streamer=None, remove_silence=False,
+                         decode_options=None):
+    """Turn a finished recording into text, or None if silence removal left no audio"""
+    if streamer:
+        return streamer.finish()
+    if not whisper_model:
+        return "Error: No whisper model provided for transcription"
+    if remove_silence:
+        current_recording, stats = trim_silence(current_recording)
+        print(f"Removed {stats['removed_seconds']:.1f}s of "
+              f"{stats['original_seconds']:.1f}s as silence")
+        if len(current_recording) == 0:
+            return None
+    return transcribe_audio(current_recording, whisper_model, decode_options=decode_options)
+
+def respond(text, code, key, lang_model, language, on_chunk=None, edit_mode=False, cancel_event=None,
+            timeout=None):
+    """
+    Send the transcription and editor code to the LLM and copy the resulting code
+    Setting cancel_event aborts the request with async_bot.RequestCancelled
+    """
+    if edit_mode and code:
+        response = request_edit(text, lang_model, key, language, code, cancel_event, timeout)
+    elif on_chunk:
+        response = stream_response(text, lang_model, key, language, on_chunk, code, cancel_event, timeout)
+    else:
+        response = send(text, lang_model, key, language, code, cancel_event=cancel_event, timeout=timeout)
+        response = send_to_bot.strip_fences(response)
+    copy(response)
+    return response
+
+def record_and_transcribe(code, key, lang_model, language, stop_event, whisper_model=None,
+                          stream_transcription=False, on_chunk=None, remove_silence=False,
+                          auto_stop_seconds=0, source=None, edit_mode=False, cancel_event=None,
+                          timeout=None, decode_options=None, incremental_mel=False):
+    """
+    Record audio until stop_event is set, then transcribe the audio
+    Now accepts the whisper model as a parameter
+    With stream_transcription the audio is transcribed while it is recorded
+    With on_chunk the LLM response is streamed to it as it is generated
+    With remove_silence non-speech is dropped before transcription, and with
+    auto_stop_seconds recording ends after that much silence following speech
+    source replaces the microphone, e.g. with a FileSource or SyntheticSource
+    With edit_mode and existing code the LLM returns only the edits to apply
+    Setting cancel_event aborts the LLM request, timeout limits it to that many seconds
+    decode_options are whisper's transcribe options, see asr_engines.decode_options
+    With incremental_mel the log-mel features are computed while recording, so
+    only the model runs after stop; it is off when silence is trimmed
+    """
+    current_recording, streamer = record_audio(stop_event, whisper_model, stream_transcription,
+                                               auto_stop_seconds, source, decode_options,
+                                               incremental_mel and not remove_silence)
+    if current_recording is None:
+        return "Failed to initialize audio"
+   
+    if not current_recording:
+        if streamer:
+            streamer.stopping.set()
+        return "No audio was recorded"
+   
+    # the editor code is sent separately so it can be cached as a prompt prefix
+    text = transcribe_recording(current_recording, whisper_model, streamer, remove_silence, decode_options)
+    if text is None:
+        # nothing is worth a paid request
+        return NO_SPEECH
+    print(f"Transcription: {code + text}")
+   
+    return respond(text, code, key, lang_model, language, on_chunk, edit_mode, cancel_event, timeout)
 
 def main(key, lang_model, language):
     """
@@ -0,0 +1,129 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+class VoiceActivityDetector:
+    """
+    Energy / zero-crossing voice activity detection over int16 audio.
+
+    A frame counts as speech when its RMS energy is well above the noise
+    floor, or moderately above it with a zero-crossing rate in the voiced
+    range. Speech regions are padded by pad_ms on both sides so word onsets
+    and short pauses survive trimming.
+
+    model, if given, replaces the heuristic: it is called with a float32
+    array of shape (frames, frame_length) and must return one speech
+    probability or bool per frame.
+    """
+
+    def __init__(self, frame_ms=30, energy_ratio=3.0, min_energy=300.0, zcr_range=(0.02, 0.35),
+                 pad_ms=300, model=None, threshold=0.5):
+        self.frame_length = int(SAMPLE_RATE * frame_ms / 1000)
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+        self.zcr_range = zcr_range
+        self.pad_frames = max(1, int(pad_ms / frame_ms))
+        self.model = model
+        self.threshold = threshold
+
+        # running state for update()
+        self.noise_floor = None
+        self.heard_speech = False
+        self.silent_samples = 0
+
+    def frames(self, samples):
+        samples = np.asarray(samples, dtype=np.int16)
+        count = samples.size // self.frame_length
+        return samples[:count * self.frame_length].reshape(count, self.frame_length)
+
+    def features(self, frames):
+        """RMS energy and zero-crossing rate of every frame"""
+        values = frames.astype(np.float32)
+        energy = np.sqrt(np.mean(values * values, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_length
+        return energy, zcr
+
+    def classify(self, frames, noise_floor):
+        if self.model is not None:
+            scores = np.asarray(self.model(frames.astype(np.float32) / 32768.0))
+            return scores >= self.threshold if scores.dtype != bool else scores
+        energy, zcr = self.features(frames)
+        loud = energy > max(self.min_energy, noise_floor * self.energy_ratio)
+        voiced = ((energy > max(self.min_energy, noise_floor * self.energy_ratio / 2))
+                  & (zcr >= self.zcr_range[0]) & (zcr <= self.zcr_range[1]))
+        return loud | voiced
+
+    def noise_floor_of(self, samples):
+        """
+        Background level of a recording: a low percentile of the RMS energy of
+        10 ms sub-frames. Even speech without pauses has short closures between
+        sounds that drop to the background level, which whole frames average
+        away, while steady noise keeps every sub-frame near its own level.
+        """
+        length = max(1, self.frame_length // 3)
+        samples = np.asarray(samples, dtype=np.int16)
+        count = samples.size // length
+        if not count:
+            return 0.0
+        values = samples[:count * length].reshape(count, length).astype(np.float32)
+        return float(np.percentile(np.sqrt(np.mean(values * values, axis=1)), 5))
+
+    def speech_mask(self, samples):
+        """Boolean speech flag per frame, padded by pad_ms around speech"""
+        frames = self.frames(samples)
+        if not len(frames):
+            return np.zeros(0, dtype=bool)
+        mask = self.classify(frames, self.noise_floor_of(samples))
+        if self.pad_frames and mask.any():
+            kernel = np.ones(2 * self.pad_frames + 1, dtype=int)
+            mask = np.convolve(mask.astype(int), kernel, mode="same") > 0
+        return mask
+
+    def trim(self, samples):
+        """
+        Drop non-speech from int16 samples.
+        Returns the kept samples and a dict with the original and removed seconds.
+        """
+        samples = np.asarray(samples, dtype=np.int16)
+        mask = self.speech_mask(samples)
+        keep = np.repeat(mask, self.frame_length)
+        # the partial frame at the end follows the last full frame
+        tail = samples.size - keep.size
+        keep = np.concatenate([keep, np.full(tail, bool(mask[-1]) if mask.size else True)])
+        trimmed = samples[keep]
+        stats = {
+            "original_seconds": samples.size / SAMPLE_RATE,
+            "removed_seconds": (samples.size - trimmed.size) / SAMPLE_RATE,
+        }
+        return trimmed, stats
+
+    def update(self, data):
+        """
+        Feed a captured chunk of int16 bytes.
+        Returns True if the chunk contains speech and keeps track of how long
+        the recording has been silent since the last speech.
+        """
+        frames = self.frames(np.frombuffer(data, dtype=np.int16))
+        if not len(frames):
+            return False
+        energy, _ = self.features(frames)
+        if self.noise_floor is None:
+            self.noise_floor = self.noise_floor_of(frames.ravel())
+        speech = self.classify(frames, self.noise_floor)
+        if speech.any():
+            self.heard_speech = True
+            self.silent_samples = 0
+        else:
+            self.silent_samples += frames.size
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * float(np.mean(energy))
+        return bool(speech.any())
+
+    @property
+    def silence_seconds(self):
+        return self.silent_samples / SAMPLE_RATE
+
+    def should_stop(self, seconds):
+        """True once speech has been heard and followed by seconds of silence"""
+        return bool(seconds) and self.heard_speech and self.silence_seconds >= seconds
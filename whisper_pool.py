@@ -0,0 +1,242 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+import numpy as np
+
+# Cores left to the GUI process (Tk, PortAudio, the LLM client) when decoding interactively
+RESERVED_CORES = 1
+# How often the collector checks for worker processes that died, in seconds
+CHECK_INTERVAL = 1.0
+
+
+def split_threads(workers=None, cores=None):
+    """
+    (workers, torch threads per worker) for this machine.
+    By default one worker gets every core but the reserved ones, which is
+    fastest for a single dictation; more workers split the cores evenly,
+    which gives more throughput on batches.
+    """
+    cores = cores or os.cpu_count() or 1
+    workers = workers or 1
+    usable = max(1, cores - RESERVED_CORES) if workers == 1 else cores
+    return workers, max(1, usable // workers)
+
+def worker_main(model_name, threads, jobs, results, engine="pytorch", quantized=False):
+    """Worker process: load the model once, then decode jobs until None arrives"""
+    try:
+        import asr_engines
+        import model_cache
+        if engine == "pytorch":
+            import torch
+            torch.set_num_threads(threads)
+            torch.set_num_interop_threads(1)
+            if quantized:
+                model = asr_engines.load_quantized(model_name)
+            else:
+                import whisper
+                model = whisper.load_model(model_name, device="cpu")
+        else:
+            model = asr_engines.load_engine(engine, model_name, threads)
+        model_cache.warm_model(model)
+    except Exception as e:
+        results.put(("failed", os.getpid(), f"{type(e).__name__}: {e}", None))
+        return
+    results.put(("ready", os.getpid(), None, None))
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, shm_name, length, options = job
+        # lets the pool fail this job if the process dies while decoding it
+        results.put(("started", os.getpid(), job_id, None))
+        start = time.perf_counter()
+        shm = shared_memory.SharedMemory(name=shm_name)
+        # decode straight from the shared block, the audio is never pickled
+        audio = np.ndarray((length,), dtype=np.float32, buffer=shm.buf)
+        try:
+            result = model.transcribe(audio, **options)
+            results.put((job_id, result, None, time.perf_counter() - start))
+        except Exception as e:
+            results.put((job_id, None, f"{type(e).__name__}: {e}", time.perf_counter() - start))
+        finally:
+            # the view has to go before the block can be closed
+            del audio
+            shm.close()
+
+
+class WhisperPool:
+    """
+    Whisper decoding in worker processes.
+
+    Each worker loads model_name once with the given asr_engines engine,
+    limited to its share of the cores (see split_threads), so decoding neither holds the GUI process's
+    GIL nor oversubscribes the CPU. Audio is copied once into a shared memory
+    block per job and the worker reads it in place. transcribe() has the
+    same shape as whisper's, so a pool can be used wherever a model is.
+    """
+
+    def __init__(self, model_name, workers=None, threads_per_worker=None, engine="pytorch", quantized=False):
+        workers, threads = split_threads(workers)
+        self.model_name = model_name
+        self.engine = engine
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or threads
+        context = multiprocessing.get_context("spawn")
+        self.jobs = context.Queue()
+        self.results = context.Queue()
+        self.processes = [
+            context.Process(target=worker_main, args=(model_name, self.threads_per_worker, self.jobs, self.results,
+                                                      engine, quantized),
+                            daemon=True)
+            for _ in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.ids = itertools.count()
+        self.pending = {}
+        # job being decoded by each worker pid
+        self.running = {}
+        self.closing = False
+        self.lock = threading.Lock()
+        self.ready = 0
+        self.ready_event = threading.Event()
+        self.load_error = None
+        self.decode_seconds = 0.0
+        self.jobs_done = 0
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+
+    def wait_ready(self, timeout=None):
+        """Block until every worker has loaded its model, raising if one could not"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ready = False
+        while not ready:
+            ready = self.ready_event.wait(0.5)
+            if not any(process.is_alive() for process in self.processes):
+                self.load_error = self.load_error or "every worker process exited"
+            if self.load_error or (deadline is not None and time.monotonic() > deadline):
+                break
+        if self.load_error:
+            raise RuntimeError(f"Whisper worker failed to load {self.model_name}: {self.load_error}")
+        return ready
+
+    def submit(self, audio, **options):
+        """Queue float32 16 kHz audio (or a file name) for decoding, returning a Future of whisper's result dict"""
+        if self.load_error:
+            raise RuntimeError(f"Whisper worker failed to load {self.model_name}: {self.load_error}")
+        if isinstance(audio, str):
+            import whisper
+            audio = whisper.load_audio(audio)
+        audio = np.asarray(audio, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, audio.nbytes))
+        np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+        future = Future()
+        job_id = next(self.ids)
+        with self.lock:
+            self.pending[job_id] = (future, shm)
+        self.jobs.put((job_id, shm.name, len(audio), options))
+        return future
+
+    def transcribe(self, audio, **options):
+        return self.submit(audio, **options).result()
+
+    def _collect(self):
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check >= CHECK_INTERVAL:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                job_id, result, error, seconds = self.results.get(timeout=CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            if job_id is None:
+                return
+            if job_id == "started":
+                self.running[result] = error
+                continue
+            if job_id == "failed":
+                print(f"Whisper worker {result} failed to load {self.model_name}: {error}")
+                self.load_error = error
+                self.ready_event.set()
+                continue
+            if job_id == "ready":
+                self.ready += 1
+                if self.ready == self.workers:
+                    self.ready_event.set()
+                continue
+            self.running = {pid: running for pid, running in self.running.items() if running != job_id}
+            with self.lock:
+                future, shm = self.pending.pop(job_id, (None, None))
+                if future is None:
+                    # the worker died after posting this result and _check_workers already failed the job
+                    continue
+                self.decode_seconds += seconds
+                self.jobs_done += 1
+            shm.close()
+            shm.unlink()
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+
+    def _check_workers(self):
+        """Fail the job of every worker that died, and all jobs once no worker is left"""
+        if self.closing:
+            return
+        alive = False
+        for process in self.processes:
+            if process.is_alive():
+                alive = True
+            elif process.pid in self.running:
+                self._fail(self.running.pop(process.pid),
+                           f"worker process {process.pid} exited with code {process.exitcode}")
+            elif not self.ready_event.is_set():
+                self.load_error = f"worker process {process.pid} exited with code {process.exitcode} while loading"
+                self.ready_event.set()
+        if not alive:
+            self.load_error = self.load_error or "every worker process exited"
+            self.ready_event.set()
+            for job_id in list(self.pending):
+                self._fail(job_id, self.load_error)
+
+    def _fail(self, job_id, error):
+        with self.lock:
+            future, shm = self.pending.pop(job_id, (None, None))
+        if future is None:
+            return
+        shm.close()
+        shm.unlink()
+        future.set_exception(RuntimeError(error))
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "jobs": self.jobs_done,
+            "pending": len(self.pending),
+            "avg_decode_s": self.decode_seconds / self.jobs_done if self.jobs_done else 0.0,
+        }
+
+    def close(self):
+        self.closing = True
+        for _ in self.processes:
+            self.jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self.results.put((None, None, None, None))
+        self.collector.join()
+        with self.lock:
+            for future, shm in self.pending.values():
+                future.cancel()
+                shm.close()
+                shm.unlink()
+            self.pending.clear()